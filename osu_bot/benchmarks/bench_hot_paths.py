@@ -0,0 +1,247 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.bench_np_parser import load_corpus
+from benchmarks.synthetic_maps import load_samples, make_pool
+
+DEFAULT_POOL_SIZES = "1000,10000,100000,1000000"
+LONG_MESSAGE = " | ".join(f"Stats for player{i}: Rank: #12 345 | Performance: 7 654.32pp | Accuracy: 98.76%" for i in range(8))
+UNICODE_MESSAGE = "FC Estimate ▸ Map: 東方 - 幻想郷 [Lunatic] ▸ Current: 321.00PP ★ " * 12
+
+
+class BenchmarkResult:
+    __slots__ = ("name", "group", "iterations", "samples", "best", "median", "p95")
+
+    def __init__(self, name: str, group: str, iterations: int, timings: List[float]):
+        timings = sorted(timings)
+        self.name = name
+        self.group = group
+        self.iterations = iterations
+        self.samples = len(timings)
+        self.best = timings[0]
+        self.median = timings[len(timings) // 2]
+        self.p95 = timings[min(len(timings) - 1, math.ceil(len(timings) * 0.95) - 1)]
+
+    def as_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'group': self.group,
+            'iterations': self.iterations,
+            'samples': self.samples,
+            'best_us': self.best * 1e6,
+            'median_us': self.median * 1e6,
+            'p95_us': self.p95 * 1e6,
+            'ops_per_second': 1 / self.median if self.median else 0.0,
+        }
+
+
+class Runner:
+    def __init__(self, min_sample_time: float, samples: int, only: Optional[str] = None):
+        self.min_sample_time = min_sample_time
+        self.sample_count = samples
+        self.only = only
+        self.results: List[BenchmarkResult] = []
+        self.skipped: Dict[str, str] = {}
+
+    def bench(self, group: str, name: str, func: Callable[[], object], setup: Optional[Callable[[], None]] = None):
+        if self.only and self.only not in f"{group}.{name}":
+            return
+        # Calibrate how many calls make one sample long enough to time reliably, like timeit's autorange
+        iterations = 1
+        while True:
+            elapsed = self._sample(func, iterations, setup)
+            if elapsed >= self.min_sample_time or iterations >= 1 << 24:
+                break
+            iterations *= 10 if elapsed < self.min_sample_time / 10 else 2
+        timings = [self._sample(func, iterations, setup) / iterations for _ in range(self.sample_count)]
+        result = BenchmarkResult(name, group, iterations, timings)
+        self.results.append(result)
+        print(f"{group:>12} {name:<40} {result.median * 1e6:>12.2f} us  ({result.as_dict()['ops_per_second']:>12,.0f} ops/s)", file=sys.stderr)
+
+    @staticmethod
+    def _sample(func: Callable[[], object], iterations: int, setup: Optional[Callable[[], None]]) -> float:
+        if setup is None:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            return time.perf_counter() - start
+        # Per-call setup (e.g. clearing caches) is kept out of the measured time
+        elapsed = 0.0
+        for _ in range(iterations):
+            setup()
+            start = time.perf_counter()
+            func()
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    def skip(self, group: str, reason: str):
+        self.skipped[group] = reason
+        print(f"{group:>12} skipped: {reason}", file=sys.stderr)
+
+
+def bench_mods(runner: Runner):
+    from utils.mods import difficulty_key, recommendation_key
+    from utils.utils import mods_to_int, mods_to_string, parse_mods
+
+    runner.bench("mods", "parse_mods(['HD', 'DT'])", lambda: parse_mods(["HD", "DT"]))
+    runner.bench("mods", "parse_mods(['+HDHRDT'])", lambda: parse_mods(["+HDHRDT"]))
+    runner.bench("mods", "parse_mods(['NM'])", lambda: parse_mods(["NM"]))
+    runner.bench("mods", "mods_to_string(HDDT)", lambda: mods_to_string(72))
+    runner.bench("mods", "mods_to_int('HDHRDT')", lambda: mods_to_int("HDHRDT"))
+    runner.bench("mods", "parse_mods(['Hidden', 'DoubleTime'])", lambda: parse_mods(["Hidden", "DoubleTime"]))
+    runner.bench("mods", "difficulty_key(HDNC)", lambda: difficulty_key(584))
+    runner.bench("mods", "recommendation_key('DTHD')", lambda: recommendation_key("DTHD"))
+
+
+def bench_np(runner: Runner):
+    from osu_bot.np_parser import is_np_message, parse_np_message
+
+    corpus = load_corpus()
+
+    def parse_corpus():
+        for line in corpus:
+            if is_np_message(line):
+                parse_np_message(line)
+
+    runner.bench("np", f"parse_np_message x{len(corpus)} lines", parse_corpus)
+
+
+def bench_pp(runner: Runner):
+    try:
+        import services.pp_calculator as pp_calculator_module
+    except ImportError as e:
+        runner.skip("pp", f"rosu_pp_py or a service dependency is missing ({e})")
+        return
+
+    samples = load_samples()
+    ids = {name: beatmap_id for beatmap_id, name in enumerate(samples, 1)}
+    maps_by_id = {ids[name]: data for name, data in samples.items()}
+
+    class SampleMaps:
+        # Stands in for OsuAPIClient.download_map so the benchmark never touches the network
+        def download_map(self, map_id: str) -> bytes:
+            return maps_by_id[int(map_id)]
+
+    calculator = pp_calculator_module.PPCalculator(SampleMaps())
+
+    def clear_caches():
+        pp_calculator_module.beatmap_cache.clear()
+        pp_calculator_module.difficulty_cache.clear()
+
+    for name, beatmap_id in ids.items():
+        runner.bench("pp", f"calculate_pp cold {name}", lambda: calculator.calculate_pp(beatmap_id, 72), setup=clear_caches)
+        runner.bench("pp", f"calculate_pp warm {name}", lambda: calculator.calculate_pp(beatmap_id, 72))
+        runner.bench("pp", f"calculate_fc_pp warm {name}", lambda: calculator.calculate_fc_pp(beatmap_id, 72, 98.5, 500))
+
+
+def bench_recommender(runner: Runner, pool_sizes: List[int]):
+    from services.recommendation_index import RecommendationIndex, RecommendationPool
+    from services.skill_profile import SkillProfile
+
+    # Measures the NumPy scorer when numpy is installed, the bisect buckets otherwise
+    variant = "scored" if RecommendationPool is not None else "bisect"
+    rng = random.Random(0)
+    for size in pool_sizes:
+        index = RecommendationIndex(directory=".", reload_interval=float("inf"))
+        # Filled in memory instead of through JSON files, so setup stays quick even at a million maps
+        index._files = {"synthetic.json": (0, make_pool(size))}
+        index._rebuild()
+        index._last_check = time.monotonic()
+        excluded = set(rng.sample(range(1, size + 1), min(200, size)))
+        profiles = [SkillProfile(rng.uniform(100, 700), {'AR': 9.3, 'OD': 8.5, 'CS': 4.0, 'BPM': 190.0}) for _ in range(1024)]
+        counter = iter(range(1 << 62))
+
+        runner.bench("recommender", f"{variant} NoMod pool={size}", lambda: index.recommend(profiles[next(counter) & 1023], "NoMod", [], excluded))
+        runner.bench("recommender", f"{variant} HDDT aim pool={size}", lambda: index.recommend(profiles[next(counter) & 1023], "HDDT", ["aim"], excluded))
+        runner.bench("recommender", f"{variant} rare tags pool={size}", lambda: index.recommend(profiles[next(counter) & 1023], "NoMod", ["nm", "speed"], excluded))
+        if RecommendationPool is not None:
+            bench_mapped_pool(runner, index._pool, size, profiles, excluded)
+        del index
+
+
+def bench_mapped_pool(runner: Runner, pool, size: int, profiles: List, excluded: set):
+    from services.recommendation_pool import RecommendationPool
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "pool.bin")
+        pool.save(path)
+        runner.bench("recommender", f"mmap load pool={size}", lambda: RecommendationPool.load(path))
+        mapped = RecommendationPool.load(path)
+        counter = iter(range(1 << 62))
+        runner.bench("recommender", f"mmap HDDT aim pool={size}", lambda: mapped.recommend(profiles[next(counter) & 1023], "HDDT", ["aim"], excluded))
+        del mapped
+
+
+def bench_messages(runner: Runner):
+    from osu_bot.message_scheduler import split_message
+
+    runner.bench("messages", "split_message short", lambda: split_message("Stats for player | Rank: #1 | 98.76%"))
+    runner.bench("messages", f"split_message {len(LONG_MESSAGE)} chars", lambda: split_message(LONG_MESSAGE))
+    runner.bench("messages", f"split_message unicode {len(UNICODE_MESSAGE)} chars", lambda: split_message(UNICODE_MESSAGE))
+
+
+def compare(results: List[Dict], baseline_path: str, threshold: float) -> List[str]:
+    with open(baseline_path, "r") as f:
+        baseline = {(result['group'], result['name']): result for result in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['group'], result['name']))
+        if previous and result['median_us'] > previous['median_us'] * (1 + threshold):
+            regressions.append(
+                f"{result['group']} {result['name']}: {previous['median_us']:.2f}us -> {result['median_us']:.2f}us "
+                f"(+{(result['median_us'] / previous['median_us'] - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the bot's hot paths")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--pool-sizes", default=DEFAULT_POOL_SIZES, help="comma-separated recommendation pool sizes")
+    parser.add_argument("--min-sample-time", type=float, default=0.05, help="seconds per timed sample")
+    parser.add_argument("--samples", type=int, default=7)
+    parser.add_argument("--only", help="run only benchmarks whose 'group.name' contains this text")
+    parser.add_argument("--baseline", help="previous JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    runner = Runner(args.min_sample_time, args.samples, args.only)
+    bench_mods(runner)
+    bench_np(runner)
+    bench_pp(runner)
+    bench_recommender(runner, [int(size) for size in args.pool_sizes.split(",") if size])
+    bench_messages(runner)
+
+    results = [result.as_dict() for result in runner.results]
+    report = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+        'skipped': runner.skipped,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+from osu_bot.np_parser import NP_PATTERN, NPMatch, is_np_message, parse_np_fast, parse_np_message, parse_np_regex
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "np_corpus.txt")
+# The lazy title group retries \s+\[ at every space, which is quadratic in the title length
+ADVERSARIAL_LINE = "is playing [https://osu.ppy.sh/beatmapsets/1#/2 Artist - " + "x " * 1000 + "[Hard]] +Hidden"
+
+
+def load_corpus(path: str = CORPUS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def normalize(result):
+    # NPHandler strips artist/title/version, so surrounding whitespace is not a difference
+    if result is None:
+        return None
+    strip = lambda value: value.strip() if value else value
+    return (result.beatmap_id, strip(result.artist), strip(result.title), strip(result.version), result.mods)
+
+
+def legacy_handle(line: str):
+    # Mirrors the previous NPHandler.parse_np, including the INFO log line per regex group
+    if "is listening to" in line or "is playing" in line or "is watching" in line or "is editing" in line or line.startswith("/np"):
+        match = NP_PATTERN.search(line)
+        if not match:
+            return None
+        for group_name in match.groupdict():
+            logging.info(f"Group {group_name}: {match.group(group_name)}")
+        beatmap_id = match.group("beatmap_id") or match.group("beatmapset_id")
+        mods_str = match.group("mods") or ""
+        return NPMatch(int(beatmap_id), match.group("artist"), match.group("title"), match.group("version"), mods_str.split())
+    return None
+
+
+def current_handle(line: str):
+    if is_np_message(line):
+        return parse_np_message(line)
+    return None
+
+
+def check_equivalence(corpus):
+    mismatches = []
+    for line in corpus:
+        expected = normalize(parse_np_regex(line))
+        actual = normalize(parse_np_message(line))
+        if expected != actual:
+            mismatches.append((line, expected, actual))
+    return mismatches
+
+
+def measure(func, corpus, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for line in corpus:
+            func(line)
+    elapsed = time.perf_counter() - start
+    return iterations * len(corpus) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NP message parser against the legacy regex")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    args = parser.parse_args()
+    # Same logging setup as main.py, but discarded so the terminal does not dominate the timings
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"), format='%(asctime)s - %(levelname)s - %(message)s')
+
+    corpus = load_corpus(args.corpus)
+    mismatches = check_equivalence(corpus)
+    for line, expected, actual in mismatches:
+        print(f"MISMATCH: {line!r}\n  regex: {expected}\n  fast:  {actual}")
+
+    groups = {
+        "osu! actions": [line for line in corpus if parse_np_fast(line)],
+        "other NP forms": [line for line in corpus if is_np_message(line) and not parse_np_fast(line)],
+        "full corpus": corpus,
+        "adversarial": [ADVERSARIAL_LINE],
+    }
+    print(f"corpus lines: {len(corpus)}")
+    for name, lines in groups.items():
+        iterations = max(1, args.iterations * len(corpus) // (len(lines) * (100 if name == "adversarial" else 1)))
+        legacy_rate = measure(legacy_handle, lines, iterations)
+        current_rate = measure(current_handle, lines, iterations)
+        print(f"{name:>15}: legacy {legacy_rate:>10,.0f} lines/s | current {current_rate:>10,.0f} lines/s ({current_rate / legacy_rate:.1f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import argparse
+import math
+import os
+import random
+from typing import Dict, List
+
+SAMPLES_DIRECTORY = os.path.join(os.path.dirname(__file__), "samples")
+
+# name: (bpm, beat divisor between objects, jump distance in osu!pixels, object count, slider share)
+SAMPLE_MAPS = {
+    "jumps": (190, 1, 260, 600, 0.2),
+    "streams": (200, 4, 40, 1200, 0.05),
+    "sliders": (170, 2, 120, 700, 0.6),
+}
+
+
+def make_osu(name: str, bpm: float, divisor: int, distance: float, objects: int, slider_share: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    beat_length = 60000 / bpm
+    step = beat_length / divisor
+    lines = [
+        "osu file format v14",
+        "",
+        "[General]",
+        "AudioFilename: audio.mp3",
+        "Mode: 0",
+        "",
+        "[Metadata]",
+        "Title:Synthetic " + name.title(),
+        "Artist:osuAtlas benchmarks",
+        "Creator:osuAtlas",
+        "Version:" + name,
+        "",
+        "[Difficulty]",
+        "HPDrainRate:5",
+        "CircleSize:4",
+        "OverallDifficulty:8.5",
+        "ApproachRate:9.3",
+        "SliderMultiplier:1.8",
+        "SliderTickRate:1",
+        "",
+        "[TimingPoints]",
+        f"0,{beat_length:.6f},4,2,0,60,1,0",
+        "",
+        "[HitObjects]",
+    ]
+    x, y = 256.0, 192.0
+    time = 1000.0
+    for i in range(objects):
+        angle = rng.uniform(0, 6.283)
+        x = min(max(x + distance * math.cos(angle), 0), 512)
+        y = min(max(y + distance * math.sin(angle), 0), 384)
+        new_combo = 4 if i % 8 == 0 else 0
+        if rng.random() < slider_share:
+            end_x = min(max(x + 80, 0), 512)
+            lines.append(f"{int(x)},{int(y)},{int(time)},{2 | new_combo},0,L|{int(end_x)}:{int(y)},1,80")
+            time += beat_length
+        else:
+            lines.append(f"{int(x)},{int(y)},{int(time)},{1 | new_combo},0,0:0:0:0:")
+            time += step
+    return "\n".join(lines) + "\n"
+
+
+def load_samples(directory: str = SAMPLES_DIRECTORY) -> Dict[str, bytes]:
+    samples = {}
+    for name in SAMPLE_MAPS:
+        with open(os.path.join(directory, f"{name}.osu"), "rb") as f:
+            samples[name] = f.read()
+    return samples
+
+
+def make_pool(size: int, seed: int = 0) -> List[dict]:
+    # Only the fields the recommendation index scores on, so a million maps still fit in memory
+    rng = random.Random(seed)
+    tag_sets = [[], ["aim"], ["speed"], ["aim", "consistency"], ["tech"], ["nm", "speed"]]
+    return [
+        {
+            'id': beatmap_id,
+            'AR': round(rng.uniform(7, 10), 1),
+            'OD': round(rng.uniform(6, 10), 1),
+            'CS': round(rng.uniform(3, 5), 1),
+            'HP': 5.0,
+            'BPM': round(rng.uniform(120, 240)),
+            'PP': {'NoMod': {'99': rng.uniform(50, 800)}, 'HDDT': {'99': rng.uniform(80, 1200)}},
+            'tags': tag_sets[beatmap_id % len(tag_sets)],
+        }
+        for beatmap_id in range(1, size + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the bundled synthetic .osu samples")
+    parser.add_argument("--output", default=SAMPLES_DIRECTORY)
+    args = parser.parse_args()
+    os.makedirs(args.output, exist_ok=True)
+    for seed, (name, settings) in enumerate(SAMPLE_MAPS.items()):
+        with open(os.path.join(args.output, f"{name}.osu"), "w", newline="\n") as f:
+            f.write(make_osu(name, *settings, seed=seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.synthetic_maps import load_samples
+
+
+class FaultInjection:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+def _user_level(username: str) -> int:
+    # Stable per-user skill so repeated lookups agree with each other
+    return sum(map(ord, username.lower())) % 600 + 100
+
+
+def beatmap_metadata(beatmap_id: int) -> Dict[str, str]:
+    return {
+        'beatmap_id': str(beatmap_id),
+        'beatmapset_id': str(beatmap_id // 3 + 1),
+        'approved': '1',
+        'artist': f"Artist {beatmap_id % 97}",
+        'title': f"Load Test Song {beatmap_id}",
+        'version': ["Easy", "Hard", "Insane", "Extra"][beatmap_id % 4],
+        'bpm': str(150 + beatmap_id % 80),
+        'max_combo': str(800 + beatmap_id % 400),
+        'difficultyrating': str(3 + beatmap_id % 5),
+        'diff_approach': '9', 'diff_overall': '8', 'diff_size': '4', 'diff_drain': '5',
+    }
+
+
+def user_stats(username: str) -> Dict[str, str]:
+    level = _user_level(username)
+    return {
+        'user_id': str(level * 1000), 'username': username, 'country': 'XX',
+        'pp_rank': str(100000 - level * 100), 'pp_country_rank': str(1000 - level),
+        'pp_raw': str(level * 10.5), 'accuracy': '97.5', 'level': '100.2', 'playcount': str(level * 50),
+        'total_score': str(level * 10 ** 7), 'count300': '1000000', 'count100': '50000', 'count50': '5000',
+        'countmiss': '0', 'max_combo': '2000',
+        'count_rank_ssh': '1', 'count_rank_ss': '2', 'count_rank_sh': '3', 'count_rank_s': '4', 'count_rank_a': '5',
+    }
+
+
+def scores(username: str, limit: int) -> List[Dict[str, str]]:
+    level = _user_level(username)
+    result = []
+    for i in range(limit):
+        beatmap_id = (level * 7 + i * 13) % 3000 + 1
+        result.append({
+            'beatmap_id': str(beatmap_id), 'pp': str(level - i * 3), 'enabled_mods': '72' if i % 3 == 0 else '0',
+            'count300': '700', 'count100': '20', 'count50': '2', 'countmiss': str(i % 4),
+            'maxcombo': str(500 + i), 'rank': 'A', 'score': '5000000',
+        })
+    return result
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    faults: FaultInjection = FaultInjection()
+    samples: List[bytes] = []
+    request_counts: Dict[str, int] = {}
+    counts_lock = threading.Lock()
+
+    def _count(self, endpoint: str):
+        with self.counts_lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def _reply(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.path.startswith("/helix/"):
+            self.send_header("Ratelimit-Limit", "800")
+            self.send_header("Ratelimit-Remaining", "799")
+            self.send_header("Ratelimit-Reset", str(int(time.time()) + 60))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        endpoint = parts.path if not parts.path.startswith("/osu/") else "/osu/:id"
+        self._count(endpoint)
+
+        time.sleep(self.faults.delay())
+        if self.faults.should_fail():
+            self._reply(500, b'{"error": "injected failure"}')
+            return
+
+        if parts.path == "/api/get_beatmaps":
+            data = [beatmap_metadata(int(query.get('b', 1)))]
+        elif parts.path == "/api/get_user":
+            data = [user_stats(query.get('u', 'player'))]
+        elif parts.path == "/api/get_user_best":
+            data = scores(query.get('u', 'player'), int(query.get('limit', 10)))
+        elif parts.path == "/api/get_user_recent":
+            data = scores(query.get('u', 'player'), int(query.get('limit', 1)))
+        elif parts.path.startswith("/osu/"):
+            beatmap_id = int(parts.path.rsplit("/", 1)[1])
+            self._reply(200, self.samples[beatmap_id % len(self.samples)], "text/plain; charset=utf-8")
+            return
+        elif parts.path == "/oauth2/token":
+            data = {'access_token': 'loadtest', 'expires_in': 3600, 'token_type': 'bearer'}
+        elif parts.path == "/helix/streams":
+            data = {'data': []}
+        else:
+            self._reply(404, b'{"error": "not found"}')
+            return
+        self._reply(200, json.dumps(data).encode("utf-8"))
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._handle()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockAPIServer:
+    def __init__(self, faults: FaultInjection, host: str = "127.0.0.1", port: int = 0):
+        handler = type("BoundMockAPIHandler", (MockAPIHandler,), {
+            'faults': faults,
+            'samples': list(load_samples().values()),
+            'request_counts': {},
+        })
+        self.handler = handler
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever, name="mock-apis")
+        thread.daemon = True
+        thread.start()
+
+    def request_counts(self) -> Dict[str, int]:
+        with self.handler.counts_lock:
+            return dict(self.handler.request_counts)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
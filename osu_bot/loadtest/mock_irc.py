@@ -0,0 +1,68 @@
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, Optional
+
+
+class MockBanchoServer:
+    # Just enough IRC for irc.bot.SingleServerIRCBot: registration, PING/PONG and PRIVMSG relaying
+    def __init__(self, on_reply: Callable[[str, str, float], None], host: str = "127.0.0.1", port: int = 0):
+        self.on_reply = on_reply
+        self.welcomed = threading.Event()
+        self.bot_nick: Optional[str] = None
+        self._connection: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self.replies = 0
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server._connection = self.connection
+                for raw_line in self.rfile:
+                    server._handle_line(raw_line.decode("utf-8", errors="replace").rstrip("\r\n"))
+                server._connection = None
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host = host
+        self.port = self.server.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever, name="mock-bancho")
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _send(self, line: str):
+        connection = self._connection
+        if connection is None:
+            return
+        with self._send_lock:
+            connection.sendall((line + "\r\n").encode("utf-8"))
+
+    def _handle_line(self, line: str):
+        received_at = time.perf_counter()
+        command, _, rest = line.partition(" ")
+        command = command.upper()
+        if command == "NICK":
+            self.bot_nick = rest.lstrip(":")
+        elif command == "USER":
+            self._send(f":mock.bancho 001 {self.bot_nick} :Welcome to the load-test Bancho")
+            self._send(f":mock.bancho 376 {self.bot_nick} :End of /MOTD command.")
+            self.welcomed.set()
+        elif command == "PING":
+            self._send(f":mock.bancho PONG mock.bancho {rest}")
+        elif command == "PRIVMSG":
+            target, _, text = rest.partition(" :")
+            self.replies += 1
+            self.on_reply(target, text, received_at)
+
+    def inject(self, user: str, text: str, action: bool = False):
+        if action:
+            text = f"\x01ACTION {text}\x01"
+        self._send(f":{user}!cho@ppy.sh PRIVMSG {self.bot_nick} :{text}")
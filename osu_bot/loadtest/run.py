@@ -0,0 +1,305 @@
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from loadtest.mock_apis import FaultInjection, MockAPIServer
+from loadtest.mock_irc import MockBanchoServer
+
+OSU_BOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAFFIC_PATH = os.path.join(os.path.dirname(__file__), "traffic.txt")
+# Puts the generated config ahead of the real one, then runs main.py as if started directly
+BOOTSTRAP = "import runpy, sys; sys.path[0:0] = sys.argv[1:3]; sys.argv = sys.argv[3:]; runpy.run_path(sys.argv[0], run_name='__main__')"
+POOL_MOD_SETS = ["NoMod", "HD", "HR", "DT", "HDHR", "HDDT"]
+POOL_TAG_SETS = [[], ["aim"], ["speed"], ["aim", "consistency"], ["tech"], ["nm", "speed"]]
+ERROR_PREFIXES = ("Error", "An error", "An unknown error")
+
+
+def load_traffic(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip() and not line.startswith("#")]
+
+
+def command_kind(template: str) -> str:
+    if template.startswith("ACTION "):
+        return "np"
+    return template.split()[0].lstrip("!")
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def write_recommendation_pool(directory: str, size: int, seed: int = 0):
+    rng = random.Random(seed)
+    pool = []
+    for beatmap_id in range(1, size + 1):
+        base_pp = rng.uniform(50, 900)
+        pool.append({
+            'id': beatmap_id, 'artist': f"Artist {beatmap_id % 97}", 'title': f"Pool Song {beatmap_id}", 'version': "Insane",
+            'AR': 9.0, 'OD': 8.0, 'CS': 4.0, 'HP': 5.0, 'BPM': 180, 'difficulty': 5.5,
+            'PP': {
+                mods: {acc: round(base_pp * (1 + 0.3 * i) * (0.8 + 0.2 * (int(acc) - 95) / 5), 2) for acc in ("95", "98", "99", "100")}
+                for i, mods in enumerate(POOL_MOD_SETS)
+            },
+            'tags': POOL_TAG_SETS[beatmap_id % len(POOL_TAG_SETS)],
+        })
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "loadtest_pool.json"), "w") as f:
+        json.dump(pool, f)
+
+
+def write_config(path: str, base_config: str, overrides: Dict[str, object]):
+    lines = [
+        "# Generated by loadtest.run: the real config with everything external pointed at local stand-ins",
+        f"exec(compile(open({base_config!r}, encoding='utf-8').read(), {base_config!r}, 'exec'))",
+    ]
+    lines.extend(f"{name} = {value!r}" for name, value in overrides.items())
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+class TrafficGenerator:
+    def __init__(self, server: MockBanchoServer, traffic: List[str], users: int, hot_maps: int, timeout: float, seed: int = 0):
+        self.server = server
+        self.traffic = traffic
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cursors = {f"loadtest_{i}": self._random.randrange(len(traffic)) for i in range(users)}
+        self._idle = set(self._cursors)
+        self._outstanding: Dict[str, tuple] = {}  # {user: (sent_at, kind, recorded)}
+        self._hot_maps = hot_maps
+        self.recording = False
+        self.sent = 0
+        self.skipped = 0
+        self.timeouts = 0
+        self.extra_chunks = 0
+        self.error_replies: Dict[str, int] = {}
+        self.latencies: Dict[str, List[float]] = {}
+
+    def _pick_beatmap(self) -> int:
+        # Zipf-like popularity: a few maps are requested constantly, most only occasionally
+        return int(self._hot_maps ** self._random.random())
+
+    def on_reply(self, target: str, text: str, received_at: float):
+        with self._lock:
+            pending = self._outstanding.pop(target, None)
+            if pending is None:
+                self.extra_chunks += 1
+                return
+            sent_at, kind, recorded = pending
+            self._idle.add(target)
+            if recorded:
+                self.latencies.setdefault(kind, []).append(received_at - sent_at)
+                if text.startswith(ERROR_PREFIXES):
+                    self.error_replies[kind] = self.error_replies.get(kind, 0) + 1
+
+    def _expire(self, now: float):
+        for user, (sent_at, _, recorded) in list(self._outstanding.items()):
+            if now - sent_at > self.timeout:
+                del self._outstanding[user]
+                self._idle.add(user)
+                if recorded:
+                    self.timeouts += 1
+
+    def send_one(self):
+        with self._lock:
+            now = time.perf_counter()
+            self._expire(now)
+            if not self._idle:
+                if self.recording:
+                    self.skipped += 1
+                return
+            user = self._random.choice(tuple(self._idle))
+            self._idle.discard(user)
+            cursor = self._cursors[user]
+            self._cursors[user] = (cursor + 1) % len(self.traffic)
+            template = self.traffic[cursor]
+            beatmap_id = self._pick_beatmap()
+            text = template.format(id=beatmap_id, set=beatmap_id // 3 + 1)
+            action = text.startswith("ACTION ")
+            if action:
+                text = text[len("ACTION "):]
+            self._outstanding[user] = (time.perf_counter(), command_kind(template), self.recording)
+            if self.recording:
+                self.sent += 1
+        self.server.inject(user, text, action=action)
+
+    def run(self, rate: float, duration: float):
+        interval = 1 / rate
+        next_send = time.perf_counter()
+        end = next_send + duration
+        while next_send < end:
+            self.send_one()
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def drain(self):
+        deadline = time.perf_counter() + self.timeout
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if not any(recorded for _, _, recorded in self._outstanding.values()):
+                    return
+            time.sleep(0.05)
+        with self._lock:
+            self._expire(time.perf_counter() + self.timeout + 1)
+
+
+def start_bot(config_directory: str, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-c", BOOTSTRAP, config_directory, OSU_BOT_DIRECTORY, os.path.join(OSU_BOT_DIRECTORY, "main.py")],
+        cwd=config_directory, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, text=True,
+    )
+
+
+def stop_bot(process: subprocess.Popen):
+    try:
+        process.stdin.write("exit\n")
+        process.stdin.flush()
+        process.wait(timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        process.kill()
+        process.wait()
+
+
+def build_report(generator: TrafficGenerator, duration: float, api_requests: Dict[str, int]) -> Dict:
+    all_latencies = [latency for latencies in generator.latencies.values() for latency in latencies]
+
+    def summarize(latencies: List[float]) -> Dict[str, float]:
+        return {
+            'count': len(latencies),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p90_ms': percentile(latencies, 0.90) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': max(latencies, default=0.0) * 1000,
+        }
+
+    return {
+        'sent': generator.sent,
+        'replied': len(all_latencies),
+        'timeouts': generator.timeouts,
+        'skipped_no_idle_user': generator.skipped,
+        'extra_reply_chunks': generator.extra_chunks,
+        'error_replies': generator.error_replies,
+        'throughput_per_second': len(all_latencies) / duration if duration else 0.0,
+        'latency': summarize(all_latencies),
+        'latency_by_command': {kind: summarize(latencies) for kind, latencies in sorted(generator.latencies.items())},
+        'api_requests': api_requests,
+    }
+
+
+def print_report(report: Dict):
+    print(f"sent {report['sent']}, replied {report['replied']}, timeouts {report['timeouts']}, "
+          f"skipped (no idle user) {report['skipped_no_idle_user']}, throughput {report['throughput_per_second']:.2f} replies/s")
+    rows = [("all", report['latency'])] + list(report['latency_by_command'].items())
+    print(f"{'command':>8} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for kind, summary in rows:
+        print(f"{kind:>8} {summary['count']:>7} {summary['p50_ms']:>9.1f} {summary['p90_ms']:>9.1f} "
+              f"{summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f} {summary['max_ms']:>9.1f}")
+    if report['error_replies']:
+        print(f"error replies: {report['error_replies']}")
+    print(f"mock API requests: {report['api_requests']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Drive a real bot process against local IRC/osu!/Twitch stand-ins")
+    parser.add_argument("--base-config", default=os.path.join(OSU_BOT_DIRECTORY, "config.py"), help="config.py to start from")
+    parser.add_argument("--traffic", default=TRAFFIC_PATH, help="recorded message mix to replay")
+    parser.add_argument("--rate", type=float, default=5.0, help="messages per second sent to the bot")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of traffic excluded from the results")
+    parser.add_argument("--users", type=int, default=200, help="virtual users; each has at most one message in flight")
+    parser.add_argument("--hot-maps", type=int, default=3000, help="number of distinct beatmaps in the traffic")
+    parser.add_argument("--pool-size", type=int, default=5000, help="synthetic recommendation pool size")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a message counts as unanswered")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mock API response latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock API requests answered with HTTP 500")
+    parser.add_argument("--outbound-rate", type=float, default=None, help="override OUTBOUND_MESSAGES_PER_SECOND (default: keep Bancho's limit)")
+    parser.add_argument("--api-rate", type=float, default=None, help="override API_REQUESTS_PER_SECOND (default: keep the configured limit)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory with the bot log")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.base_config):
+        print(f"{args.base_config} not found; pass --base-config with a working config.py", file=sys.stderr)
+        return 2
+
+    work_directory = tempfile.mkdtemp(prefix="osu_bot_loadtest_")
+    api_server = MockAPIServer(FaultInjection(args.latency_ms, args.jitter_ms, args.error_rate, seed=1))
+    api_server.start()
+    generator: Optional[TrafficGenerator] = None
+    irc_server = MockBanchoServer(lambda target, text, received_at: generator.on_reply(target, text, received_at))
+    generator = TrafficGenerator(irc_server, load_traffic(args.traffic), args.users, args.hot_maps, args.timeout)
+    irc_server.start()
+
+    write_recommendation_pool(os.path.join(work_directory, "recommendations"), args.pool_size)
+    overrides = {
+        'IRC_SERVER': irc_server.host,
+        'IRC_PORT': irc_server.port,
+        'OSU_BASE_URL': api_server.base_url,
+        'TWITCH_API_BASE_URL': api_server.base_url,
+        'TWITCH_AUTH_URL': f"{api_server.base_url}/oauth2/token",
+        'MAPS_DIRECTORY': os.path.join(work_directory, "maps"),
+        'RECOMMENDATIONS_DIRECTORY': os.path.join(work_directory, "recommendations"),
+        'BEATMAP_METADATA_DB': os.path.join(work_directory, "beatmaps.sqlite3"),
+        'SESSION_STORE_PATH': os.path.join(work_directory, "sessions.json"),
+        'METRICS_PORT': None,
+    }
+    if args.outbound_rate is not None:
+        overrides['OUTBOUND_MESSAGES_PER_SECOND'] = args.outbound_rate
+    if args.api_rate is not None:
+        overrides['API_REQUESTS_PER_SECOND'] = args.api_rate
+    write_config(os.path.join(work_directory, "config.py"), os.path.abspath(args.base_config), overrides)
+
+    log_path = os.path.join(work_directory, "bot.log")
+    bot = start_bot(work_directory, log_path)
+    try:
+        deadline = time.monotonic() + 30
+        while not irc_server.welcomed.wait(0.2):
+            if bot.poll() is not None or time.monotonic() > deadline:
+                print(f"The bot did not connect, see {log_path}", file=sys.stderr)
+                return 1
+        print(f"bot connected; warming up for {args.warmup:.0f}s, then {args.duration:.0f}s at {args.rate} msg/s", file=sys.stderr)
+        generator.run(args.rate, args.warmup)
+        generator.recording = True
+        start = time.perf_counter()
+        generator.run(args.rate, args.duration)
+        generator.drain()
+        elapsed = time.perf_counter() - start
+    finally:
+        stop_bot(bot)
+        irc_server.stop()
+        api_server.stop()
+
+    report = build_report(generator, elapsed, api_server.request_counts())
+    report['settings'] = {key: value for key, value in vars(args).items() if key not in ("output", "keep")}
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.keep:
+        print(f"bot log and data kept in {work_directory}", file=sys.stderr)
+    else:
+        shutil.rmtree(work_directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
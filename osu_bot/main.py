@@ -1,20 +1,29 @@
+import time
+STARTED_AT = time.perf_counter()
+
 import os
 import threading
 import logging
 from osu_bot.osu_bot import OsuBot
+from utils.metrics import metrics, start_metrics_server
 
 def console_input(bot):
     while True:
         message = input()
         if message.lower() == "exit":
+            bot.stop()
             os._exit(0)
+        elif message.lower() == "stats":
+            print(metrics.summary())
         else:
             bot.handle_message(message, None, "Console")
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     
-    bot = OsuBot()
+    bot = OsuBot(STARTED_AT)
+    logging.info(f"Bot constructed {(time.perf_counter() - STARTED_AT) * 1000:.0f}ms after start")
+    start_metrics_server()
     
     input_thread = threading.Thread(target=console_input, args=(bot,))
     input_thread.daemon = True
@@ -25,4 +34,6 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logging.info("The bot has been stopped.")
     except Exception as e:
-        logging.error(f"An error occurred: {e}")
\ No newline at end of file
+        logging.error(f"An error occurred: {e}")
+    finally:
+        bot.stop()
\ No newline at end of file
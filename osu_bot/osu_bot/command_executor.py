@@ -0,0 +1,52 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+import config
+
+COMMAND_WORKERS = getattr(config, "COMMAND_WORKERS", 8)
+
+
+class CommandExecutor:
+    def __init__(self, workers: int = COMMAND_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="command")
+        self._lock = threading.Condition()
+        # A sender has a queue here only while one of its commands is scheduled or running,
+        # which is what keeps each sender's commands in order
+        self._queues: Dict[str, deque] = {}
+
+    def submit(self, sender: str, func: Callable, *args):
+        with self._lock:
+            queue = self._queues.get(sender)
+            if queue is not None:
+                queue.append((func, args))
+                return
+            self._queues[sender] = deque([(func, args)])
+        self._pool.submit(self._run_next, sender)
+
+    def _run_next(self, sender: str):
+        with self._lock:
+            func, args = self._queues[sender].popleft()
+        try:
+            func(*args)
+        except Exception as e:
+            logging.error(f"Command from {sender} failed: {e}", exc_info=True)
+        with self._lock:
+            if not self._queues[sender]:
+                del self._queues[sender]
+                self._lock.notify_all()
+                return
+        # Requeue instead of looping so a chatty sender cannot pin a worker
+        self._pool.submit(self._run_next, sender)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def shutdown(self, wait: bool = True):
+        if wait:
+            with self._lock:
+                self._lock.wait_for(lambda: not self._queues)
+        self._pool.shutdown(wait=wait)
@@ -1,22 +1,38 @@
-from services.osu_api_client import OsuAPIClient
-from services.pp_calculator import PPCalculator
-from utils.utils import parse_mods
-from services.beatmap_recommender import BeatmapRecommender
+import config
+from utils.utils import mods_to_string, parse_mods
+
+COMPARE_MAX_USERS = getattr(config, "COMPARE_MAX_USERS", 5)
 
 class CommandHandler:
     def __init__(self, bot):
         self.bot = bot
-        self.api_client = OsuAPIClient()
-        self.pp_calculator = PPCalculator()
-        self.recommender = BeatmapRecommender()
-        
+
+    # Shared services from the bot's container, built on first use
+    @property
+    def api_client(self):
+        return self.bot.services.api_client
+
+    @property
+    def pp_calculator(self):
+        return self.bot.services.pp_calculator
+
+    @property
+    def fc_estimator(self):
+        return self.bot.services.fc_estimator
+
+    @property
+    def recommender(self):
+        return self.bot.services.recommender
+
     def handle_help_command(self) -> str:
+        # Read at call time: importing services.fc_estimator here would load rosu_pp_py and requests on startup
+        fc_max_plays = getattr(config, "FC_MAX_PLAYS", 5)
         return " | ".join([
             "Available commands:",
             "!pp <map_id> [mods] - Calculate PP for a map",
             "!stats <username> - Show user statistics",
-            "!compare <username1> <username2> - Compare two users",
-            "!fc [username] - Calculate FC PP for user's last play",
+            f"!compare <username1> <username2> [...] - Compare up to {COMPARE_MAX_USERS} users",
+            f"!fc [username] [1-{fc_max_plays}] - Calculate FC PP for user's last play (or last N plays)",
             "!with <mods> - Recalculate PP with different mods for the last map",
             "!r [params] - Get a map recommendation",
             "!notifyme <twitch_username> - Get notified when a Twitch streamer goes live",
@@ -33,11 +49,10 @@ class CommandHandler:
         
         try:
             mods = parse_mods(mods_str.split())
-            beatmap_path = self.api_client.download_map(map_id)
             map_info = self.api_client.get_map_info(map_id)
-            pp_values, stars, ar, od, cs, hp = self.pp_calculator.calculate_pp(beatmap_path, mods)
+            pp_values, stars, ar, od, cs, hp = self.pp_calculator.calculate_pp(map_id, mods)
             
-            self.bot.last_map[sender] = {'id': map_id, 'mods': mods}
+            self.bot.set_last_map(sender, map_id, mods)
             
             return self.pp_calculator.format_pp_result(map_info, pp_values, stars, ar, od, cs, hp, mods)
         except ValueError as e:
@@ -48,7 +63,8 @@ class CommandHandler:
             return f"An unknown error occurred: {str(e)}"
 
     def handle_with_command(self, message: str, sender: str) -> str:
-        if sender not in self.bot.last_map:
+        last_map = self.bot.sessions.get_last_map(sender)
+        if last_map is None:
             return "First use the !pp, !fc or /np command to select a map."
         
         parts = message.split()
@@ -56,7 +72,7 @@ class CommandHandler:
             return "Please specify mods. Example: !with HDDT"
         
         new_mods = ' '.join(parts[1:])
-        map_id = self.bot.last_map[sender]['id']
+        map_id, _ = last_map
         
         return self.handle_pp_command(f"!pp {map_id} {new_mods}", sender)
 
@@ -128,13 +144,12 @@ class CommandHandler:
 
     def handle_compare_command(self, message: str) -> str:
         parts = message.split()
-        if len(parts) != 3:
-            return "Usage: !compare <username1> <username2>"
+        if not 3 <= len(parts) <= COMPARE_MAX_USERS + 1:
+            return f"Usage: !compare <username1> <username2> [...] (up to {COMPARE_MAX_USERS} users)"
         
-        username1, username2 = parts[1], parts[2]
+        usernames = parts[1:]
         try:
-            stats1 = self.api_client.get_user_stats(username1)
-            stats2 = self.api_client.get_user_stats(username2)
+            users_stats = self.api_client.get_users_stats(usernames)
 
             def safe_get(stats, key, default=0):
                 return stats.get(key, default)
@@ -159,16 +174,16 @@ class CommandHandler:
                 ('A Count', 'count_rank_a', int, True)
             ]
 
-            result = f"Comparison between {stats1['username']} and {stats2['username']}:\n\n"
+            names = [stats['username'] for stats in users_stats]
+            result = f"Comparison between {', '.join(names[:-1])} and {names[-1]}:\n\n"
             for name, key, convert, higher_better in comparisons:
-                val1 = safe_convert(safe_get(stats1, key), convert)
-                val2 = safe_convert(safe_get(stats2, key), convert)
+                values = [safe_convert(safe_get(stats, key), convert) for stats in users_stats]
                 if key == 'accuracy':
-                    val1, val2 = round(val1, 2), round(val2, 2)
-                result += f"{name}: {val1:,} vs {val2:,} "
-                if val1 != val2:
+                    values = [round(value, 2) for value in values]
+                result += f"{name}: {' vs '.join(f'{value:,}' for value in values)} "
+                if len(set(values)) > 1:
                     better = max if higher_better else min
-                    winner = stats1['username'] if better(val1, val2) == val1 else stats2['username']
+                    winner = names[values.index(better(values))]
                     result += f"({winner} is better)"
                 result += "\n"
 
@@ -181,46 +196,40 @@ class CommandHandler:
         
     def handle_fc_command(self, message: str, sender: str) -> str:
         parts = message.split()
-        if len(parts) == 1:
-            username = sender
-        elif len(parts) == 2:
+        username = sender
+        limit = 1
+        fc_max_plays = getattr(config, "FC_MAX_PLAYS", 5)
+        # A trailing number up to FC_MAX_PLAYS is a play count, anything else is a username
+        if len(parts) > 1 and parts[-1].isdigit() and 1 <= int(parts[-1]) <= fc_max_plays:
+            limit = int(parts.pop())
+        if len(parts) == 2:
             username = parts[1]
-        else:
-            return "Usage: !fc [username]"
+        elif len(parts) > 2:
+            return f"Usage: !fc [username] [1-{fc_max_plays}]"
         
         try:
-            last_play = self.api_client.get_last_play(username)
-            beatmap_id = last_play['beatmap_id']
-            
-            beatmap_path = self.api_client.download_map(beatmap_id)
-            
-            beatmap_info = self.api_client.get_map_info(beatmap_id)
-            
-            count300 = int(last_play['count300'])
-            count100 = int(last_play['count100'])
-            count50 = int(last_play['count50'])
-            countmiss = int(last_play['countmiss'])
-            total_hits = count300 + count100 + count50 + countmiss
-            current_acc = (count300 * 300 + count100 * 100 + count50 * 50) / (total_hits * 300) * 100
-
-            fc_300s = count300 + countmiss
-            fc_acc = (fc_300s * 300 + count100 * 100 + count50 * 50) / ((total_hits) * 300) * 100
-
-            mods = int(last_play['enabled_mods'])
-
-            fc_pp = self.pp_calculator.calculate_fc_pp(beatmap_path, mods, fc_acc, int(beatmap_info['max_combo']))
-
-            current_pp = self.pp_calculator.calculate_fc_pp(beatmap_path, mods, current_acc, int(last_play['maxcombo']))
-
-            self.bot.last_map[sender] = {'id': beatmap_id, 'mods': mods}
-
-            return (
-                f"FC Estimate for {username}'s last play:\n"
-                f"▸ Map: {beatmap_info['artist']} - {beatmap_info['title']} [{beatmap_info['version']}]\n"
-                f"▸ Current: {current_pp:.2f}PP ({current_acc:.2f}% | {last_play['maxcombo']}/{beatmap_info['max_combo']}x | {countmiss} misses)\n"
-                f"▸ If FC: {fc_pp:.2f}PP ({fc_acc:.2f}%)\n"
-                f"▸ Difference: +{fc_pp - current_pp:.2f}PP"
-            )
+            estimates = self.fc_estimator.estimate_recent(username, limit)
+            latest = estimates[0]
+            self.bot.set_last_map(sender, latest.play['beatmap_id'], latest.mods)
+
+            if len(estimates) == 1:
+                beatmap_info = latest.map_info
+                return (
+                    f"FC Estimate for {username}'s last play:\n"
+                    f"▸ Map: {beatmap_info['artist']} - {beatmap_info['title']} [{beatmap_info['version']}]\n"
+                    f"▸ Current: {latest.current_pp:.2f}PP ({latest.current_acc:.2f}% | {latest.play['maxcombo']}/{latest.max_combo}x | {latest.play['countmiss']} misses)\n"
+                    f"▸ If FC: {latest.fc_pp:.2f}PP ({latest.fc_acc:.2f}%)\n"
+                    f"▸ Difference: +{latest.fc_pp - latest.current_pp:.2f}PP"
+                )
+
+            lines = [f"FC Estimates for {username}'s last {len(estimates)} plays:"]
+            for number, estimate in enumerate(estimates, 1):
+                beatmap_info = estimate.map_info
+                lines.append(
+                    f"{number}. {beatmap_info['artist']} - {beatmap_info['title']} [{beatmap_info['version']}] +{mods_to_string(estimate.mods)} "
+                    f"| {estimate.current_pp:.2f}PP → FC {estimate.fc_pp:.2f}PP (+{estimate.fc_pp - estimate.current_pp:.2f}PP, {estimate.fc_acc:.2f}%)"
+                )
+            return "\n".join(lines)
         except ValueError as e:
             return str(e)
         except ConnectionError as e:
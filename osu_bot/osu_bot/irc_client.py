@@ -1,4 +1,5 @@
 import irc.bot
+import irc.client
 import logging
 from config import IRC_SERVER, IRC_PORT, IRC_NICKNAME, IRC_PASSWORD
 
@@ -17,15 +18,21 @@ class IRCClient(irc.bot.SingleServerIRCBot):
 
     def on_welcome(self, connection, event):
         logging.info(f"Bot {connection.get_nickname()} connected to the IRC server.")
+        self.bot.on_connected()
 
     def on_pubmsg(self, connection, event):
-        self.bot.handle_message(event.arguments[0], connection, event.source.nick, is_private=False)
+        self.bot.submit_message(event.arguments[0], connection, event.source.nick, is_private=False)
 
     def on_privmsg(self, connection, event):
-        self.bot.handle_message(event.arguments[0], connection, event.source.nick, is_private=True)
+        self.bot.submit_message(event.arguments[0], connection, event.source.nick, is_private=True)
 
     def on_action(self, connection, event):
-        self.bot.handle_message(event.arguments[0], connection, event.source.nick, is_private=False)
+        # osu! sends /np as an ACTION in a private message, which has to be answered privately as well
+        is_private = not irc.client.is_channel(event.target)
+        self.bot.submit_message(event.arguments[0], connection, event.source.nick, is_private=is_private)
+
+    def deliver_message(self, target: str, message: str):
+        self.connection.privmsg(target, message)
 
     def send_message(self, connection, target: str, message: str, is_private: bool):
         if connection:
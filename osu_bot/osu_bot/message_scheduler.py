@@ -0,0 +1,130 @@
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List
+
+import config
+from services.rate_limiter import TokenBucketRateLimiter
+
+IRC_MESSAGE_MAX_BYTES = 400
+# Bancho silences clients that send more than roughly ten messages per five seconds
+OUTBOUND_MESSAGES_PER_SECOND = getattr(config, "OUTBOUND_MESSAGES_PER_SECOND", 1.5)
+OUTBOUND_BURST = getattr(config, "OUTBOUND_BURST", 5)
+OUTBOUND_MAX_QUEUED_PER_TARGET = getattr(config, "OUTBOUND_MAX_QUEUED_PER_TARGET", 10)
+
+
+def split_message(message: str, max_bytes: int = IRC_MESSAGE_MAX_BYTES) -> List[str]:
+    message = message.replace('\n', ' ').replace('\r', '')
+    chunks = []
+    current = ""
+    current_bytes = 0
+    for word in message.split(' '):
+        word_bytes = len(word.encode('utf-8'))
+        separator = 1 if current else 0
+        if current_bytes + separator + word_bytes <= max_bytes:
+            current = f"{current} {word}" if current else word
+            current_bytes += separator + word_bytes
+            continue
+        if current:
+            chunks.append(current)
+            current, current_bytes = "", 0
+        # A single word longer than the limit is cut on character boundaries
+        while word_bytes > max_bytes:
+            cut, cut_bytes = 0, 0
+            for char in word:
+                char_bytes = len(char.encode('utf-8'))
+                if cut_bytes + char_bytes > max_bytes:
+                    break
+                cut += 1
+                cut_bytes += char_bytes
+            chunks.append(word[:cut])
+            word = word[cut:]
+            word_bytes -= cut_bytes
+        current, current_bytes = word, word_bytes
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class _QueuedMessage:
+    __slots__ = ("text", "chunks")
+
+    def __init__(self, text: str, chunks: List[str]):
+        self.text = text
+        self.chunks = deque(chunks)
+
+
+class OutboundMessageScheduler:
+    def __init__(self, send: Callable[[str, str], None], rate: float = OUTBOUND_MESSAGES_PER_SECOND, burst: int = OUTBOUND_BURST):
+        self._send = send
+        self._limiter = TokenBucketRateLimiter(rate, burst, name="irc")
+        self._condition = threading.Condition()
+        # Targets rotate through this dict one chunk at a time, which gives round-robin fairness
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self.sent = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+        thread = threading.Thread(target=self._run, name="outbound-messages")
+        thread.daemon = True
+        thread.start()
+
+    def enqueue(self, target: str, message: str):
+        chunks = split_message(message)
+        if not chunks:
+            return
+        with self._condition:
+            queue = self._queues.get(target)
+            if queue is None:
+                queue = self._queues[target] = deque()
+            # The head message may already be partly sent, so it never counts as a duplicate
+            if any(queued.text == message for queued in list(queue)[1:]):
+                self.deduplicated += 1
+                return
+            if len(queue) >= OUTBOUND_MAX_QUEUED_PER_TARGET:
+                self.dropped += 1
+                logging.warning(f"Outbound queue for {target} is full, dropping message")
+                return
+            queue.append(_QueuedMessage(message, chunks))
+            self.max_depth = max(self.max_depth, self._depth())
+            self._condition.notify()
+
+    def _next_chunk(self):
+        with self._condition:
+            while not self._queues:
+                self._condition.wait()
+            target, queue = next(iter(self._queues.items()))
+            message = queue[0]
+            chunk = message.chunks.popleft()
+            if not message.chunks:
+                queue.popleft()
+            if queue:
+                self._queues.move_to_end(target)
+            else:
+                del self._queues[target]
+            return target, chunk
+
+    def _run(self):
+        while True:
+            target, chunk = self._next_chunk()
+            self._limiter.acquire()
+            try:
+                self._send(target, chunk)
+                self.sent += 1
+            except Exception as e:
+                logging.error(f"Failed to send message to {target}: {e}")
+
+    def _depth(self) -> int:
+        return sum(len(message.chunks) for queue in self._queues.values() for message in queue)
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                'queued_chunks': self._depth(),
+                'queued_targets': len(self._queues),
+                'max_depth': self.max_depth,
+                'sent': self.sent,
+                'deduplicated': self.deduplicated,
+                'dropped': self.dropped,
+            }
@@ -0,0 +1,87 @@
+import re
+from typing import List, NamedTuple, Optional
+
+NP_PATTERN = re.compile(
+    r"(?:\* (?P<username>\w+)\s*)?"
+    r"(?:/np\s+)?"
+    r"(?:is\s+)?"
+    r"(?:listening to|playing|watching|editing)?\s*"
+    r"(?:\[)?"
+    r"(?P<url>https?://osu\.ppy\.sh/beatmapsets/(?P<beatmapset_id>\d+)(?:#osu/|#/)?(?P<beatmap_id>\d+))"
+    r"(?:\s+(?P<artist>.+?) - (?P<title>.+?)(?:\s+\[(?P<version>.+?)\])?)?"
+    r"(?:\])?"
+    r"(?:\s*(?P<mods>(?:[-+](?:Easy|NoFail|HalfTime|HardRock|SuddenDeath|DoubleTime|Nightcore|Hidden|Flashlight|SpunOut|Autopilot|Perfect)(?:\s+)?)+))?\s*$"
+)
+
+NP_MARKERS = ("is listening to", "is playing", "is watching", "is editing")
+NP_MOD_NAMES = frozenset((
+    "Easy", "NoFail", "HalfTime", "HardRock", "SuddenDeath", "DoubleTime",
+    "Nightcore", "Hidden", "Flashlight", "SpunOut", "Autopilot", "Perfect",
+))
+BEATMAPSETS_PATH = "osu.ppy.sh/beatmapsets/"
+# Anchored right after BEATMAPSETS_PATH, so it cannot backtrack more than a few characters
+BEATMAP_IDS_PATTERN = re.compile(r"\d+(?:#osu/|#/)(\d+)")
+# Whitespace other than a plain space makes the regex's \s matches ambiguous, so such lines take the slow path
+UNUSUAL_WHITESPACE = frozenset("\t\n\r\x0b\x0c")
+
+
+class NPMatch(NamedTuple):
+    beatmap_id: int
+    artist: Optional[str]
+    title: Optional[str]
+    version: Optional[str]
+    mods: List[str]
+
+
+def is_np_message(message: str) -> bool:
+    if message.startswith("/np"):
+        return True
+    if "is " not in message:
+        return False
+    return any(marker in message for marker in NP_MARKERS)
+
+
+def parse_np_regex(message: str) -> Optional[NPMatch]:
+    match = NP_PATTERN.search(message)
+    if not match:
+        return None
+    beatmap_id = match.group("beatmap_id") or match.group("beatmapset_id")
+    mods_str = match.group("mods") or ""
+    return NPMatch(int(beatmap_id), match.group("artist"), match.group("title"), match.group("version"), mods_str.split())
+
+
+def parse_np_fast(message: str) -> Optional[NPMatch]:
+    # Linear parser for the action osu! itself sends:
+    #   is listening to [https://osu.ppy.sh/beatmapsets/1#/2 Artist - Title [Version]] +Hidden
+    # Returns None for anything else; callers then fall back to NP_PATTERN.
+    start = message.find(BEATMAPSETS_PATH)
+    if start < 0 or not (message.endswith("https://", 0, start) or message.endswith("http://", 0, start)):
+        return None
+    ids = BEATMAP_IDS_PATTERN.match(message, start + len(BEATMAPSETS_PATH))
+    if not ids:
+        return None
+
+    rest = message[ids.end():]
+    link_end = rest.rfind("]]")
+    if link_end < 0:
+        return None
+    mods = rest[link_end + 2:].split()
+    for mod in mods:
+        if mod[0] not in "+-" or mod[1:] not in NP_MOD_NAMES:
+            return None
+
+    head = rest[:link_end + 1]
+    if not head.startswith(" ") or not UNUSUAL_WHITESPACE.isdisjoint(head):
+        return None
+    # NP_PATTERN's \s+ swallows every space before the artist and before "[version]"
+    artist, separator, rest = head.lstrip(" ").partition(" - ")
+    title, bracket, version = rest.partition(" [")
+    title = title.rstrip(" ")
+    version = version[:-1]
+    if not separator or not bracket or not artist or not title.strip() or not version or "]" in version:
+        return None
+    return NPMatch(int(ids.group(1)), artist, title, version, mods)
+
+
+def parse_np_message(message: str) -> Optional[NPMatch]:
+    return parse_np_fast(message) or parse_np_regex(message)
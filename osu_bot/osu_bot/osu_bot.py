@@ -1,46 +1,99 @@
+import time
+import logging
 from .irc_client import IRCClient
 from .command_handler import CommandHandler
 from .np_handler import NPHandler
-from services.osu_api_client import OsuAPIClient
-from services.pp_calculator import PPCalculator
-from services.beatmap_recommender import BeatmapRecommender
+from .np_parser import is_np_message
+from services.container import ServiceContainer
+from services.session_store import session_store
+from utils.metrics import command_errors, command_latency, metrics
 from utils.utils import UserException
-from .twitch_integration import TwitchIntegration
+from .command_executor import CommandExecutor
+from .message_scheduler import OutboundMessageScheduler
 
 
 class OsuBot:
-    def __init__(self):
+    def __init__(self, started_at: float = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.services = ServiceContainer(self)
         self.irc_client = IRCClient(self)
+        self.outbound = OutboundMessageScheduler(self.irc_client.deliver_message)
         self.command_handler = CommandHandler(self)
         self.np_handler = NPHandler(self)
-        self.api_client = OsuAPIClient()
-        self.pp_calculator = PPCalculator()
-        self.recommender = BeatmapRecommender()
-        self.twitch_integration = TwitchIntegration(self)
-        self.last_map = {}
+        self.sessions = session_store
+        self.command_executor = CommandExecutor()
+        self.connected_after = None
+        metrics.register_stats("outbound", self.outbound.stats)
+        metrics.register_stats("commands", lambda: {'pending': self.command_executor.pending()})
+        metrics.register_stats("connection", lambda: {'connected_after_seconds': self.connected_after} if self.connected_after is not None else {})
+
+    @property
+    def api_client(self):
+        return self.services.api_client
+
+    @property
+    def pp_calculator(self):
+        return self.services.pp_calculator
+
+    @property
+    def precomputer(self):
+        return self.services.precomputer
+
+    @property
+    def twitch_integration(self):
+        return self.services.twitch_integration
 
     def start(self):
         self.irc_client.start()
 
+    def on_connected(self):
+        if self.connected_after is None:
+            self.connected_after = time.perf_counter() - self.started_at
+            logging.info(f"Connected {self.connected_after * 1000:.0f}ms after start")
+            self.services.start_warm_up()
+
+    def stop(self):
+        self.sessions.save()
+
+    def set_last_map(self, sender: str, beatmap_id, mods: int):
+        previous_id = self.sessions.set_last_map(sender, beatmap_id, mods)
+        # The next message is very often !with on the same map, so warm the popular mod combos for it
+        if previous_id != int(beatmap_id):
+            self.precomputer.schedule(sender, beatmap_id, mods)
+
+    def submit_message(self, message: str, connection, sender: str, is_private: bool = False):
+        self.command_executor.submit(sender, self.handle_message, message, connection, sender, is_private)
+
     def handle_message(self, message: str, connection, sender: str, is_private: bool = False):
+        command = "unknown"
+        start = time.perf_counter()
         try:
             if message.startswith("!help"):
+                command = "help"
                 response = self.command_handler.handle_help_command()
             elif message.startswith("!pp"):
+                command = "pp"
                 response = self.command_handler.handle_pp_command(message, sender)
-            elif "is listening to" in message or "is playing" in message or "is watching" in message or "is editing" in message or message.startswith("/np"):
+            elif is_np_message(message):
+                command = "np"
                 response = self.np_handler.handle(message, sender)
             elif message.startswith("!with"):
+                command = "with"
                 response = self.command_handler.handle_with_command(message, sender)
             elif message.startswith("!r"):
+                command = "r"
                 response = self.command_handler.handle_recommendation_command(message, sender)
             elif message.startswith("!notifyme"):
+                command = "notifyme"
                 response = self.command_handler.handle_notifyme_command(message, sender)
             elif message.startswith("!stats"):
+                command = "stats"
                 response = self.command_handler.handle_stats_command(message)
             elif message.startswith("!compare"):
+                command = "compare"
                 response = self.command_handler.handle_compare_command(message)
             elif message.startswith("!fc"):
+                command = "fc"
                 response = self.command_handler.handle_fc_command(message, sender)
             else:
                 response = "Unknown command. Type !help for a list of available commands."
@@ -48,23 +101,24 @@ class OsuBot:
             if response:
                 self.send_message(connection, sender, response, is_private)
         except UserException as e:
+            command_errors.inc(command=command)
             self.send_message(connection, sender, str(e), is_private)
         except Exception as e:
+            command_errors.inc(command=command)
             self.send_message(connection, sender, f"An error occurred: {str(e)}", is_private)
+        finally:
+            command_latency.observe(time.perf_counter() - start, command=command)
 
     def send_message(self, connection, target: str, message: str, is_private: bool):
-        # Заменяем символы новой строки на пробелы
-        message = message.replace('\n', ' ').replace('\r', '')
-        
-        # Разбиваем длинные сообщения на части
-        max_length = 400  # Максимальная длина сообщения IRC
-        messages = [message[i:i+max_length] for i in range(0, len(message), max_length)]
-        
         if connection:
-            for msg in messages:
-                if is_private:
-                    connection.privmsg(target, msg)
-                else:
-                    connection.privmsg(self.channel, msg)
+            # Chunking, flood control and per-target fairness are handled by the scheduler thread
+            self.outbound.enqueue(target if is_private else self.channel, message)
+        else:
+            message = message.replace('\n', ' ').replace('\r', '')
+            print(f"Message sent to {target}: {message}")
+
+    def notify_user(self, username: str, message: str):
+        if self.irc_client.connection.is_connected():
+            self.outbound.enqueue(username, message)
         else:
-            print(f"Message sent to {target}: {message}")
\ No newline at end of file
+            print(f"Message sent to {username}: {message}")
\ No newline at end of file
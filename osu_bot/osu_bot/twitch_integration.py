@@ -1,9 +1,21 @@
-import json
+import math
 import os
-import requests
 import time
 import threading
+import config
 from config import TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET
+from services.http_session import http_client
+from services.subscription_store import SubscriptionStore
+from utils.metrics import metrics
+
+TWITCH_API_BASE_URL = getattr(config, "TWITCH_API_BASE_URL", "https://api.twitch.tv")
+TWITCH_AUTH_URL = getattr(config, "TWITCH_AUTH_URL", "https://id.twitch.tv/oauth2/token")
+HELIX_STREAMS_URL = f"{TWITCH_API_BASE_URL}/helix/streams"
+HELIX_MAX_LOGINS_PER_REQUEST = 100
+TWITCH_MIN_POLL_INTERVAL = getattr(config, "TWITCH_MIN_POLL_INTERVAL", 60)
+TWITCH_MAX_POLL_INTERVAL = getattr(config, "TWITCH_MAX_POLL_INTERVAL", 600)
+# Fraction of the Helix rate-limit bucket that stream polling is allowed to use
+TWITCH_POLL_BUDGET_SHARE = getattr(config, "TWITCH_POLL_BUDGET_SHARE", 0.5)
 
 class TwitchIntegration:
     def __init__(self, bot):
@@ -12,22 +24,34 @@ class TwitchIntegration:
         self.client_secret = TWITCH_CLIENT_SECRET
         self.access_token = None
         self.token_expiration = 0
-        self.subscriptions = {}  # {twitch_username: set(osu_usernames)}
         self.known_live_streams = set()
-        self.subscriptions_file = "data/twitch_subscriptions/twitch_subscriptions.json"
-        self.load_subscriptions()
+        self.ratelimit_limit = 800  # Helix default bucket size per minute
+        self.ratelimit_remaining = None
+        self.ratelimit_reset = 0
+        self.last_cycle_duration = 0.0
+        self.last_cycle_requests = 0
+        self.subscriptions = SubscriptionStore(
+            "data/twitch_subscriptions/twitch_subscriptions.log",
+            legacy_json_path="data/twitch_subscriptions/twitch_subscriptions.json"
+        )
+        metrics.register_stats("twitch", lambda: {
+            'subscriptions': self.subscriptions.count(),
+            'streamers': self.subscriptions.streamer_count(),
+            'last_cycle_duration': self.last_cycle_duration,
+            'last_cycle_requests': self.last_cycle_requests,
+        })
         self.start_polling()
 
     def get_access_token(self):
         current_time = time.time()
         if current_time > self.token_expiration:
-            url = "https://id.twitch.tv/oauth2/token"
+            url = TWITCH_AUTH_URL
             params = {
                 "client_id": self.client_id,
                 "client_secret": self.client_secret,
                 "grant_type": "client_credentials"
             }
-            response = requests.post(url, params=params)
+            response = http_client.post(url, params=params)
             if response.status_code == 200:
                 data = response.json()
                 self.access_token = data["access_token"]
@@ -36,58 +60,82 @@ class TwitchIntegration:
                 raise Exception(f"Failed to get access token: {response.text}")
         return self.access_token
 
-    def load_subscriptions(self):
-        if os.path.exists(self.subscriptions_file):
-            with open(self.subscriptions_file, 'r') as f:
-                loaded_subscriptions = json.load(f)
-            self.subscriptions = {k: set(v) for k, v in loaded_subscriptions.items()}
-        else:
-            self.subscriptions = {}
-    
-    def save_subscriptions(self):
-        subscriptions_to_save = {k: list(v) for k, v in self.subscriptions.items()}
-        os.makedirs(os.path.dirname(self.subscriptions_file), exist_ok=True)
-        with open(self.subscriptions_file, 'w') as f:
-            json.dump(subscriptions_to_save, f)
-            
     def subscribe_to_stream(self, osu_username: str, twitch_username: str):
-        if twitch_username not in self.subscriptions:
-            self.subscriptions[twitch_username] = set()
-        self.subscriptions[twitch_username].add(osu_username)
-        self.save_subscriptions()
+        self.subscriptions.add(twitch_username, osu_username)
         return True
 
     def unsubscribe_from_stream(self, osu_username: str, twitch_username: str):
-        if twitch_username in self.subscriptions:
-            self.subscriptions[twitch_username].discard(osu_username)
-            if not self.subscriptions[twitch_username]:
-                del self.subscriptions[twitch_username]
-            self.save_subscriptions()
+        self.subscriptions.remove(twitch_username, osu_username)
         return True
 
     def check_streams(self):
+        twitch_usernames = self.subscriptions.streamers()
+        if not twitch_usernames:
+            self.last_cycle_duration = 0.0
+            self.last_cycle_requests = 0
+            return
+
+        start = time.monotonic()
         headers = {
             "Client-ID": self.client_id,
             "Authorization": f"Bearer {self.get_access_token()}"
         }
-        for twitch_username in self.subscriptions:
-            url = f"https://api.twitch.tv/helix/streams?user_login={twitch_username}"
-            response = requests.get(url, headers=headers)
+        live_logins = set()
+        failed_usernames = set()
+        requests_sent = 0
+        for i in range(0, len(twitch_usernames), HELIX_MAX_LOGINS_PER_REQUEST):
+            batch = twitch_usernames[i:i + HELIX_MAX_LOGINS_PER_REQUEST]
+            params = [("user_login", twitch_username) for twitch_username in batch]
+            params.append(("first", HELIX_MAX_LOGINS_PER_REQUEST))
+            response = http_client.get(HELIX_STREAMS_URL, headers=headers, params=params)
+            requests_sent += 1
+            self.update_rate_limit(response)
             if response.status_code == 200:
-                data = response.json()["data"]
-                if data and twitch_username not in self.known_live_streams:
-                    self.known_live_streams.add(twitch_username)
-                    self.handle_stream_online(twitch_username)
-                elif not data and twitch_username in self.known_live_streams:
-                    self.known_live_streams.remove(twitch_username)
+                live_logins.update(stream["user_login"].lower() for stream in response.json()["data"])
             else:
-                print(f"Failed to check stream status for {twitch_username}: {response.text}")
+                failed_usernames.update(batch)
+                print(f"Failed to check stream status for {len(batch)} streamers: {response.text}")
+
+        for twitch_username in twitch_usernames:
+            if twitch_username in failed_usernames:
+                continue
+            is_live = twitch_username.lower() in live_logins
+            if is_live and twitch_username not in self.known_live_streams:
+                self.known_live_streams.add(twitch_username)
+                self.handle_stream_online(twitch_username)
+            elif not is_live and twitch_username in self.known_live_streams:
+                self.known_live_streams.remove(twitch_username)
+
+        self.last_cycle_requests = requests_sent
+        self.last_cycle_duration = time.monotonic() - start
+
+    def update_rate_limit(self, response):
+        headers = response.headers
+        try:
+            if "Ratelimit-Limit" in headers:
+                self.ratelimit_limit = int(headers["Ratelimit-Limit"])
+            if "Ratelimit-Remaining" in headers:
+                self.ratelimit_remaining = int(headers["Ratelimit-Remaining"])
+            if "Ratelimit-Reset" in headers:
+                self.ratelimit_reset = int(headers["Ratelimit-Reset"])
+        except ValueError:
+            pass
+
+    def next_poll_interval(self) -> float:
+        requests_per_cycle = max(1, math.ceil(self.subscriptions.streamer_count() / HELIX_MAX_LOGINS_PER_REQUEST))
+
+        # The Helix bucket refills every minute; stay within our share of it
+        interval = requests_per_cycle * 60 / max(1, self.ratelimit_limit * TWITCH_POLL_BUDGET_SHARE)
+        if self.ratelimit_remaining is not None and self.ratelimit_remaining < requests_per_cycle:
+            interval = max(interval, self.ratelimit_reset - time.time())
+        return min(max(interval, TWITCH_MIN_POLL_INTERVAL), TWITCH_MAX_POLL_INTERVAL)
 
     def handle_stream_online(self, twitch_username: str):
-        if twitch_username in self.subscriptions:
+        osu_usernames = self.subscriptions.subscribers_of(twitch_username)
+        if osu_usernames:
             print(f"Stream started: {twitch_username}")
-            for osu_username in self.subscriptions[twitch_username]:
-                self.bot.send_message(None, osu_username, f"{twitch_username} has started streaming!", True)
+            for osu_username in osu_usernames:
+                self.bot.notify_user(osu_username, f"{twitch_username} has started streaming!")
 
     def start_polling(self):
         def poll():
@@ -96,7 +144,7 @@ class TwitchIntegration:
                     self.check_streams()
                 except Exception as e:
                     print(f"Error during stream check: {str(e)}")
-                time.sleep(60)  # Check every 1 minute
+                time.sleep(self.next_poll_interval())
 
         thread = threading.Thread(target=poll)
         thread.daemon = True
@@ -0,0 +1,73 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import config
+from utils.metrics import metrics
+
+BEATMAP_METADATA_DB = getattr(config, "BEATMAP_METADATA_DB", "data/beatmap_metadata/beatmaps.sqlite3")
+RANKED_METADATA_TTL = getattr(config, "RANKED_METADATA_TTL", 30 * 24 * 3600)
+UNRANKED_METADATA_TTL = getattr(config, "UNRANKED_METADATA_TTL", 3600)
+
+# osu! API v1 "approved" values whose metadata no longer changes: ranked, approved, loved
+FROZEN_APPROVED_STATUSES = {'1', '2', '4'}
+
+
+class BeatmapMetadataStore:
+    def __init__(self, path: str = BEATMAP_METADATA_DB):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS beatmaps ("
+                "beatmap_id INTEGER PRIMARY KEY, "
+                "data TEXT NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def get(self, beatmap_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT data, expires_at FROM beatmaps WHERE beatmap_id = ?", (int(beatmap_id),)
+            ).fetchone()
+            if row is None or row[1] < time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, map_info: Dict[str, Any]):
+        if str(map_info.get('approved')) in FROZEN_APPROVED_STATUSES:
+            ttl = RANKED_METADATA_TTL
+        else:
+            ttl = UNRANKED_METADATA_TTL
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO beatmaps (beatmap_id, data, expires_at) VALUES (?, ?, ?)",
+                (int(map_info['beatmap_id']), json.dumps(map_info), time.time() + ttl)
+            )
+            connection.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+metadata_store = BeatmapMetadataStore()
+metrics.register_stats("metadata_store", metadata_store.stats)
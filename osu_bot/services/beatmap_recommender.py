@@ -1,52 +1,36 @@
-import random
 from typing import List, Dict, Any, Optional
 from config import MODS
 from services.osu_api_client import OsuAPIClient
+from services.recommendation_index import recommendation_index
+from services.session_store import SessionStore, session_store
+from services.skill_profile import SkillProfile, build_skill_profile
+from utils.mods import recommendation_key
 from utils.utils import apply_mods_to_difficulty, ar_to_ms, mods_to_int, mods_to_string, ms_to_ar, ms_to_od, od_to_ms
 
 class BeatmapRecommender:
-    def __init__(self):
-        self.api_client = OsuAPIClient()
-        self.recommended_maps = {}
+    def __init__(self, api_client: OsuAPIClient = None, sessions: SessionStore = session_store):
+        self.api_client = api_client or OsuAPIClient()
+        self.sessions = sessions
 
     def get_recommendation(self, username: str, params: List[str]) -> str:
         top_scores = self.api_client.get_user_top_scores(username)
-        average_pp = self.api_client.calculate_average_pp(top_scores)
+        profile = build_skill_profile(top_scores, recommendation_index.stats_for)
 
         tags = [param.lower() for param in params if param.lower() in ["aim", "speed", "nm", "consistency", "tech"]]
         mods = [param.upper() for param in params if param.upper() in MODS.keys()]
         
         mods_string = ''.join(mods) if mods else 'NoMod'
 
-        recommended_map = self._get_recommendation(average_pp, mods_string, tags, self.recommended_maps.get(username, set()))
+        recommended_map = self._get_recommendation(profile, recommendation_key(mods_string), tags, self.sessions.recommended(username))
         if not recommended_map:
             return "There are no suitable maps for you with the given parameters ;("
 
-        self.recommended_maps.setdefault(username, set()).add(recommended_map['id'])
+        self.sessions.add_recommended(username, recommended_map['id'])
 
         return self._format_recommended_beatmap(recommended_map, mods_string)
 
-    def _get_recommendation(self, user_pp: float, mods: str, tags: List[str], recommended_maps: set) -> Optional[Dict[str, Any]]:
-        suitable_maps = []
-        
-        for beatmap in self.api_client.load_map_recommendations():
-            if beatmap['id'] in recommended_maps:
-                continue
-
-            if mods not in beatmap['PP']:
-                continue
-            
-            if tags and not set(tags).issubset(set(beatmap['tags'])):
-                continue
-            
-            pp_values = beatmap['PP'].get(mods, beatmap['PP']['NoMod'])
-            
-            if not (user_pp - 100 <= pp_values['99'] <= user_pp + 100):
-                continue
-            
-            suitable_maps.append(beatmap)
-
-        return random.choice(suitable_maps) if suitable_maps else None
+    def _get_recommendation(self, profile: SkillProfile, mods: str, tags: List[str], recommended_maps: set) -> Optional[Dict[str, Any]]:
+        return recommendation_index.recommend(profile, mods, tags, recommended_maps)
 
     def _format_recommended_beatmap(self, map_info: Dict[str, Any], mods: str) -> str:
         beatmap_url = f"https://osu.ppy.sh/beatmaps/{map_info['id']}"
@@ -79,7 +63,7 @@ class BeatmapRecommender:
             cs *= 0.5
             hp *= 0.5
         
-        pp_values = map_info['PP'].get(mods, map_info['PP']['NoMod'])
+        pp_values = map_info['PP'].get(recommendation_key(mods_int), map_info['PP']['NoMod'])
         
         stars = apply_mods_to_difficulty(map_info['difficulty'], mods_int)
         
@@ -0,0 +1,267 @@
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import config
+from config import MAPS_DIRECTORY
+from utils.metrics import metrics
+
+BEATMAP_STORE_MAX_BYTES = getattr(config, "BEATMAP_STORE_MAX_BYTES", 2 * 1024 ** 3)
+BEATMAP_PACK_MAX_BYTES = getattr(config, "BEATMAP_PACK_MAX_BYTES", 64 * 1024 ** 2)
+
+INDEX_MAGIC = b"OSUIDX1\0"
+# beatmap_id, pack number, offset, stored (compressed) length, raw length, crc32 of the raw .osu
+INDEX_RECORD = struct.Struct("<QIQIII")
+PACK_NAME = re.compile(r"^pack-(\d{6})\.bin$")
+
+
+class StoreEntry(NamedTuple):
+    pack: int
+    offset: int
+    stored_length: int
+    raw_length: int
+    crc: int
+
+
+class BeatmapStore:
+    def __init__(self, directory: str = MAPS_DIRECTORY, max_bytes: int = BEATMAP_STORE_MAX_BYTES, pack_max_bytes: int = BEATMAP_PACK_MAX_BYTES,
+                 read_only: bool = False):
+        self.directory = directory
+        # For other processes (e.g. the recommendation builder) reading the live bot's store: nothing on disk is
+        # truncated, rewritten, appended to or deleted
+        self.read_only = read_only
+        self.max_bytes = max_bytes
+        self.pack_max_bytes = pack_max_bytes
+        self.index_path = os.path.join(directory, "index.bin")
+        self._lock = threading.RLock()
+        self._entries: Dict[int, StoreEntry] = {}
+        self._pack_sizes: Dict[int, int] = {}
+        self._pack_fds: Dict[int, int] = {}
+        self._index = None
+        self.reads = 0
+        self.writes = 0
+        self.corrupt = 0
+        self.evicted_packs = 0
+
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if self.read_only and not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            match = PACK_NAME.match(filename)
+            if match:
+                self._pack_sizes[int(match.group(1))] = os.path.getsize(os.path.join(self.directory, filename))
+
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) < len(INDEX_MAGIC):
+            if not self.read_only:
+                self._rewrite_index()
+        else:
+            with open(self.index_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                    if index[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                        raise ValueError(f"{self.index_path} is not a beatmap store index")
+                    # A record cut short by a crash is ignored; its data was never acknowledged
+                    usable = (len(index) - len(INDEX_MAGIC)) // INDEX_RECORD.size * INDEX_RECORD.size
+                    for beatmap_id, pack, offset, stored_length, raw_length, crc in INDEX_RECORD.iter_unpack(
+                            index[len(INDEX_MAGIC):len(INDEX_MAGIC) + usable]):
+                        if stored_length == 0:
+                            self._entries.pop(beatmap_id, None)
+                        elif offset + stored_length <= self._pack_sizes.get(pack, 0):
+                            self._entries[beatmap_id] = StoreEntry(pack, offset, stored_length, raw_length, crc)
+            # In read-only mode the partial record may be the owner's append in progress, so it is left alone
+            if not self.read_only and usable + len(INDEX_MAGIC) != os.path.getsize(self.index_path):
+                with open(self.index_path, "r+b") as f:
+                    f.truncate(usable + len(INDEX_MAGIC))
+        if not self.read_only:
+            self._index = open(self.index_path, "ab")
+
+    def _rewrite_index(self):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(INDEX_MAGIC)
+            for beatmap_id, entry in self._entries.items():
+                f.write(INDEX_RECORD.pack(beatmap_id, *entry))
+            f.flush()
+            os.fsync(f.fileno())
+        if self._index is not None:
+            self._index.close()
+        os.replace(temp_path, self.index_path)
+        self._index = open(self.index_path, "ab")
+
+    def _pack_path(self, pack: int) -> str:
+        return os.path.join(self.directory, f"pack-{pack:06d}.bin")
+
+    def _pack_fd(self, pack: int) -> int:
+        fd = self._pack_fds.get(pack)
+        if fd is None:
+            fd = self._pack_fds[pack] = os.open(self._pack_path(pack), os.O_RDONLY)
+        return fd
+
+    def __contains__(self, beatmap_id) -> bool:
+        return int(beatmap_id) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return list(self._entries)
+
+    def get_entry(self, beatmap_id) -> Optional[StoreEntry]:
+        return self._entries.get(int(beatmap_id))
+
+    def total_bytes(self) -> int:
+        return sum(self._pack_sizes.values())
+
+    def get(self, beatmap_id) -> Optional[bytes]:
+        beatmap_id = int(beatmap_id)
+        with self._lock:
+            entry = self._entries.get(beatmap_id)
+            if entry is None:
+                return None
+            try:
+                stored = os.pread(self._pack_fd(entry.pack), entry.stored_length, entry.offset)
+            except FileNotFoundError:
+                if not self.read_only:
+                    raise
+                # The owning process evicted the pack after this store was opened
+                return None
+        try:
+            data = zlib.decompress(stored)
+        except zlib.error:
+            data = None
+        if data is None or len(data) != entry.raw_length or zlib.crc32(data) != entry.crc:
+            self.corrupt += 1
+            if self.read_only:
+                logging.error(f"Beatmap {beatmap_id} failed its checksum in the store, skipping it")
+                return None
+            logging.error(f"Beatmap {beatmap_id} failed its checksum in the store, dropping it")
+            self.delete(beatmap_id)
+            return None
+        self.reads += 1
+        return data
+
+    def put(self, beatmap_id, data: bytes):
+        self.put_stream(beatmap_id, [data])
+
+    def put_stream(self, beatmap_id, chunks: Iterable[bytes]) -> int:
+        if self.read_only:
+            raise ValueError(f"{self.directory} was opened read-only")
+        beatmap_id = int(beatmap_id)
+        compressor = zlib.compressobj(6)
+        crc = 0
+        raw_length = 0
+        # Compressed into a scratch file first so a failing download never touches a pack
+        with tempfile.TemporaryFile(dir=self.directory) as scratch:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                crc = zlib.crc32(chunk, crc)
+                raw_length += len(chunk)
+                scratch.write(compressor.compress(chunk))
+            scratch.write(compressor.flush())
+            if raw_length == 0:
+                raise ValueError(f"Refusing to store an empty beatmap {beatmap_id}")
+            stored_length = scratch.tell()
+            scratch.seek(0)
+
+            with self._lock:
+                pack = max(self._pack_sizes, default=1)
+                if self._pack_sizes.get(pack, 0) + stored_length > self.pack_max_bytes and self._pack_sizes.get(pack, 0) > 0:
+                    pack += 1
+                with open(self._pack_path(pack), "ab") as f:
+                    # The offset comes from the file, not _pack_sizes, so it is right even after an earlier failed append
+                    offset = f.seek(0, os.SEEK_END)
+                    try:
+                        shutil.copyfileobj(scratch, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    except BaseException:
+                        # Drop the partial write so the pack stays exactly the acknowledged entries
+                        f.truncate(offset)
+                        raise
+                self._pack_sizes[pack] = offset + stored_length
+
+                # The index record is what makes the entry visible, so it is written last
+                entry = StoreEntry(pack, offset, stored_length, raw_length, crc)
+                self._index.write(INDEX_RECORD.pack(beatmap_id, *entry))
+                self._index.flush()
+                os.fsync(self._index.fileno())
+                self._entries[beatmap_id] = entry
+                self.writes += 1
+                self._evict()
+        return raw_length
+
+    def delete(self, beatmap_id):
+        if self.read_only:
+            raise ValueError(f"{self.directory} was opened read-only")
+        beatmap_id = int(beatmap_id)
+        with self._lock:
+            if self._entries.pop(beatmap_id, None) is not None:
+                self._index.write(INDEX_RECORD.pack(beatmap_id, 0, 0, 0, 0, 0))
+                self._index.flush()
+
+    def _evict(self):
+        if self.total_bytes() <= self.max_bytes or len(self._pack_sizes) <= 1:
+            return
+        # Whole packs are dropped oldest first; the active (newest) pack is never evicted
+        newest = max(self._pack_sizes)
+        while self.total_bytes() > self.max_bytes and len(self._pack_sizes) > 1:
+            oldest = min(self._pack_sizes)
+            if oldest == newest:
+                break
+            fd = self._pack_fds.pop(oldest, None)
+            if fd is not None:
+                os.close(fd)
+            del self._pack_sizes[oldest]
+            self._entries = {beatmap_id: entry for beatmap_id, entry in self._entries.items() if entry.pack != oldest}
+            os.remove(self._pack_path(oldest))
+            self.evicted_packs += 1
+            logging.info(f"Evicted beatmap pack {oldest} to stay under {self.max_bytes} bytes")
+        self._rewrite_index()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'maps': len(self._entries),
+            'packs': len(self._pack_sizes),
+            'bytes': self.total_bytes(),
+            'reads': self.reads,
+            'writes': self.writes,
+            'corrupt': self.corrupt,
+            'evicted_packs': self.evicted_packs,
+        }
+
+    def close(self):
+        with self._lock:
+            for fd in self._pack_fds.values():
+                os.close(fd)
+            self._pack_fds.clear()
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_beatmap_store() -> BeatmapStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BeatmapStore()
+        return _store
+
+
+# Reported once something has opened the store; scraping should not create it
+metrics.register_stats("beatmap_store", lambda: _store.stats() if _store is not None else {})
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from utils.metrics import metrics
+from utils.single_flight import SingleFlight
+
+
+class ServiceContainer:
+    # Each service is built once, on first use. The factories import their modules themselves,
+    # so rosu_pp_py, requests and friends are only loaded when something actually needs them.
+    def __init__(self, bot):
+        self.bot = bot
+        # Builds are single-flighted per service, so a slow one (e.g. Twitch replaying its log) never blocks the others
+        self._builds = SingleFlight()
+        self._instances: Dict[str, Any] = {}
+        self._warm_up_lock = threading.Lock()
+        self._warm_up_started = False
+        self.construction_times: Dict[str, float] = {}
+        self.warmup_seconds = None
+        metrics.register_stats("startup", self.stats)
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            instance = self._builds.do(name, lambda: self._build(name, factory))
+        return instance
+
+    def _build(self, name: str, factory: Callable[[], Any]) -> Any:
+        # Another build of this service may have finished between the caller's check and this flight
+        instance = self._instances.get(name)
+        if instance is None:
+            start = time.perf_counter()
+            instance = factory()
+            self.construction_times[name] = time.perf_counter() - start
+            self._instances[name] = instance
+        return instance
+
+    def is_started(self, name: str) -> bool:
+        return name in self._instances
+
+    @property
+    def api_client(self):
+        def create():
+            from services.osu_api_client import OsuAPIClient
+            return OsuAPIClient()
+        return self._get("api_client", create)
+
+    @property
+    def pp_calculator(self):
+        def create():
+            from services.pp_calculator import PPCalculator
+            return PPCalculator(self.api_client)
+        return self._get("pp_calculator", create)
+
+    @property
+    def fc_estimator(self):
+        def create():
+            from services.fc_estimator import FCEstimator
+            return FCEstimator(self.api_client, self.pp_calculator)
+        return self._get("fc_estimator", create)
+
+    @property
+    def precomputer(self):
+        def create():
+            from services.pp_precomputer import PPPrecomputer
+            precomputer = PPPrecomputer(self.pp_calculator)
+            metrics.register_stats("precompute", precomputer.stats)
+            return precomputer
+        return self._get("precomputer", create)
+
+    @property
+    def recommender(self):
+        def create():
+            from services.beatmap_recommender import BeatmapRecommender
+            return BeatmapRecommender(self.api_client)
+        return self._get("recommender", create)
+
+    @property
+    def twitch_integration(self):
+        def create():
+            from osu_bot.twitch_integration import TwitchIntegration
+            return TwitchIntegration(self.bot)
+        return self._get("twitch_integration", create)
+
+    def warm_up(self):
+        # Runs after the IRC welcome, so none of this delays connecting
+        start = time.perf_counter()
+        steps = [
+            ("twitch polling", lambda: self.twitch_integration),
+            ("pp calculator", lambda: self.precomputer),
+            ("recommendation index", self._warm_recommendations),
+            ("beatmap store", self._open_beatmap_store),
+        ]
+        for description, step in steps:
+            try:
+                step()
+            except Exception as e:
+                logging.error(f"Warm-up of {description} failed: {e}")
+        self.warmup_seconds = time.perf_counter() - start
+        logging.info(f"Services warmed up in {self.warmup_seconds * 1000:.0f}ms")
+
+    def start_warm_up(self):
+        # Called on every IRC welcome; reconnects must not warm up (and force an index reload) again
+        with self._warm_up_lock:
+            if self._warm_up_started:
+                return
+            self._warm_up_started = True
+        thread = threading.Thread(target=self.warm_up, name="service-warm-up")
+        thread.daemon = True
+        thread.start()
+
+    def _warm_recommendations(self):
+        from services.recommendation_index import recommendation_index
+        self.recommender
+        recommendation_index.refresh(force=True)
+
+    @staticmethod
+    def _open_beatmap_store():
+        from services.beatmap_store import get_beatmap_store
+        get_beatmap_store()
+
+    def stats(self) -> Dict[str, float]:
+        stats = {f"{name}_construct_seconds": seconds for name, seconds in self.construction_times.items()}
+        if self.warmup_seconds is not None:
+            stats['warmup_seconds'] = self.warmup_seconds
+        return stats
\ No newline at end of file
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple
+from rosu_pp_py import Performance
+import config
+from services.osu_api_client import OsuAPIClient
+from services.pp_calculator import PPCalculator
+from utils.metrics import calculation_latency
+
+FC_FETCH_WORKERS = getattr(config, "FC_FETCH_WORKERS", 4)
+FC_MAX_PLAYS = getattr(config, "FC_MAX_PLAYS", 5)
+
+# Map metadata and the parsed map are independent, so they are fetched side by side
+fc_fetch_pool = ThreadPoolExecutor(max_workers=FC_FETCH_WORKERS, thread_name_prefix="fc-fetch")
+
+
+class FCEstimate(NamedTuple):
+    play: Dict[str, Any]
+    map_info: Dict[str, Any]
+    mods: int
+    max_combo: int
+    current_acc: float
+    fc_acc: float
+    current_pp: float
+    fc_pp: float
+
+
+def accuracy(count300: int, count100: int, count50: int, countmiss: int) -> float:
+    total_hits = count300 + count100 + count50 + countmiss
+    return (count300 * 300 + count100 * 100 + count50 * 50) / (total_hits * 300) * 100
+
+
+class FCEstimator:
+    def __init__(self, api_client: OsuAPIClient, pp_calculator: PPCalculator):
+        self.api_client = api_client
+        self.pp_calculator = pp_calculator
+
+    def estimate_recent(self, username: str, limit: int = 1) -> List[FCEstimate]:
+        plays = self.api_client.get_recent_plays(username, min(limit, FC_MAX_PLAYS))
+        # Every map is requested up front; repeated maps collapse in the caches and single-flights
+        pending = [
+            (
+                play,
+                fc_fetch_pool.submit(self.api_client.get_map_info, play['beatmap_id']),
+                fc_fetch_pool.submit(self.pp_calculator.get_difficulty, play['beatmap_id'], int(play['enabled_mods'])),
+            )
+            for play in plays
+        ]
+        return [self._estimate(play, map_info.result(), difficulty.result()[0]) for play, map_info, difficulty in pending]
+
+    def _estimate(self, play: Dict[str, Any], map_info: Dict[str, Any], difficulty_attrs) -> FCEstimate:
+        mods = int(play['enabled_mods'])
+        count300 = int(play['count300'])
+        count100 = int(play['count100'])
+        count50 = int(play['count50'])
+        countmiss = int(play['countmiss'])
+        max_combo = int(map_info.get('max_combo') or difficulty_attrs.max_combo)
+
+        # One Performance over the shared attributes: the play as set, then the same hits with misses turned into 300s
+        with calculation_latency.time(operation="performance"):
+            perf = Performance(mods=mods)
+            perf.set_n300(count300)
+            perf.set_n100(count100)
+            perf.set_n50(count50)
+            perf.set_misses(countmiss)
+            perf.set_combo(int(play['maxcombo']))
+            current_pp = perf.calculate(difficulty_attrs).pp
+
+            perf.set_n300(count300 + countmiss)
+            perf.set_misses(0)
+            perf.set_combo(max_combo)
+            fc_pp = perf.calculate(difficulty_attrs).pp
+
+        return FCEstimate(
+            play=play,
+            map_info=map_info,
+            mods=mods,
+            max_combo=max_combo,
+            current_acc=accuracy(count300, count100, count50, countmiss),
+            fc_acc=accuracy(count300 + countmiss, count100, count50, 0),
+            current_pp=current_pp,
+            fc_pp=fc_pp,
+        )
\ No newline at end of file
@@ -0,0 +1,95 @@
+import re
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+from utils.metrics import http_latency, http_requests, metrics
+
+HTTP_CONNECT_TIMEOUT = getattr(config, "HTTP_CONNECT_TIMEOUT", 3.05)
+HTTP_READ_TIMEOUT = getattr(config, "HTTP_READ_TIMEOUT", 15)
+HTTP_DEFAULT_POOL_SIZE = getattr(config, "HTTP_DEFAULT_POOL_SIZE", 4)
+HTTP_POOL_SIZES = getattr(config, "HTTP_POOL_SIZES", {
+    "osu.ppy.sh": 8,
+    "api.twitch.tv": 4,
+    "id.twitch.tv": 1,
+})
+# Ids in paths (e.g. /osu/123) would give every beatmap its own metric series
+PATH_IDS = re.compile(r"/\d+")
+
+
+class HostStats:
+    __slots__ = ("requests", "errors", "total_latency", "max_latency")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'average_latency': self.total_latency / self.requests if self.requests else 0.0,
+            'max_latency': self.max_latency,
+        }
+
+
+class HTTPClient:
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=HTTP_DEFAULT_POOL_SIZE))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=HTTP_DEFAULT_POOL_SIZE))
+        for host, pool_size in HTTP_POOL_SIZES.items():
+            self.session.mount(f"https://{host}/", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self._lock = threading.Lock()
+        self.host_stats: Dict[str, HostStats] = {}
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        parts = urlsplit(url)
+        host = parts.hostname
+        endpoint = f"{host}{PATH_IDS.sub('/:id', parts.path)}"
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(host, endpoint, time.perf_counter() - start, "error")
+            raise
+        self._record(host, endpoint, time.perf_counter() - start, response.status_code)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def _record(self, host: str, endpoint: str, latency: float, status):
+        error = status == "error" or status >= 500
+        http_latency.observe(latency, endpoint=endpoint)
+        http_requests.inc(endpoint=endpoint, status=status)
+        with self._lock:
+            stats = self.host_stats.get(host)
+            if stats is None:
+                stats = self.host_stats[host] = HostStats()
+            stats.requests += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            if error:
+                stats.errors += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {host: stats.as_dict() for host, stats in self.host_stats.items()}
+
+
+# One keep-alive connection pool per host, shared by the osu! and Twitch integrations
+http_client = HTTPClient()
+metrics.register_stats("http", http_client.stats)
@@ -1,41 +1,69 @@
-import json
+import logging
 import requests
-import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
-from config import OSU_API_KEY, REQUEST_INTERVAL, MAPS_DIRECTORY, RECOMMENDATIONS_DIRECTORY
+import config
+from config import OSU_API_KEY, MAPS_DIRECTORY
+from services.beatmap_metadata_store import metadata_store
+from services.beatmap_store import get_beatmap_store
+from services.http_session import http_client
+from services.rate_limiter import PRIORITY_INTERACTIVE, api_rate_limiter
+from utils.lru_cache import LRUCache
+from utils.metrics import metrics
+from utils.single_flight import SingleFlight
+
+USER_CACHE_MAX_ENTRIES = getattr(config, "USER_CACHE_MAX_ENTRIES", 1024)
+USER_STATS_TTL = getattr(config, "USER_STATS_TTL", 60)
+USER_TOP_SCORES_TTL = getattr(config, "USER_TOP_SCORES_TTL", 300)
+USER_LOOKUP_WORKERS = getattr(config, "USER_LOOKUP_WORKERS", 4)
+# Overridable so the load-test harness can point the bot at local stand-ins
+OSU_BASE_URL = getattr(config, "OSU_BASE_URL", "https://osu.ppy.sh")
+
+# Concurrent lookups of the same beatmap wait on one request instead of each hitting the API
+map_info_requests = SingleFlight()
+map_downloads = SingleFlight()
+user_stats_requests = SingleFlight()
+top_scores_requests = SingleFlight()
+
+# osu! usernames are case-insensitive, so the caches are keyed by the lowercased name
+user_stats_cache = LRUCache(USER_CACHE_MAX_ENTRIES, ttl=USER_STATS_TTL)
+top_scores_cache = LRUCache(USER_CACHE_MAX_ENTRIES, ttl=USER_TOP_SCORES_TTL)
+metrics.register_stats("user_stats_cache", user_stats_cache.stats)
+metrics.register_stats("top_scores_cache", top_scores_cache.stats)
+user_lookup_pool = ThreadPoolExecutor(max_workers=USER_LOOKUP_WORKERS, thread_name_prefix="user-lookup")
 
 
 class OsuAPIClient:
     def __init__(self):
         self.api_key = OSU_API_KEY
-        self.last_request_time = 0
 
-    def rate_limited_request(self, url: str, params: Dict[str, Any] = None) -> requests.Response:
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        if time_since_last_request < REQUEST_INTERVAL:
-            time.sleep(REQUEST_INTERVAL - time_since_last_request)
-        
-        response = requests.get(url, params=params)
-        self.last_request_time = time.time()
-        return response
+    def rate_limited_request(self, url: str, params: Dict[str, Any] = None, priority: int = PRIORITY_INTERACTIVE, stream: bool = False) -> requests.Response:
+        api_rate_limiter.acquire(priority)
+        try:
+            return http_client.get(url, params=params, stream=stream)
+        except requests.RequestException as e:
+            raise ConnectionError(f"Request to osu! API failed: {e}") from e
 
     def get_map_info(self, map_id: str) -> Dict[str, Any]:
-        url = f"https://osu.ppy.sh/api/get_beatmaps"
+        map_info = metadata_store.get(map_id)
+        if map_info is not None:
+            return map_info
+        return map_info_requests.do(str(map_id), lambda: self._fetch_map_info(map_id))
+
+    def _fetch_map_info(self, map_id: str) -> Dict[str, Any]:
+        url = f"{OSU_BASE_URL}/api/get_beatmaps"
         params = {
             'k': self.api_key,
             'b': map_id
         }
         response = self.rate_limited_request(url, params=params)
-        
-        # Добавляем print для вывода ответа перед парсингом
-        print(f"Response status code: {response.status_code}")
-        print(f"Response content: {response.text}")
+        logging.debug(f"get_beatmaps {map_id}: status {response.status_code}")
         
         if response.status_code == 200:
-            data = response.json()  # Ошибка может возникнуть здесь
+            data = response.json()
             if data:
+                metadata_store.put(data[0])
                 return data[0]
             else:
                 raise ValueError("Map not found")
@@ -44,7 +72,18 @@ class OsuAPIClient:
 
         
     def get_user_stats(self, username: str) -> dict:
-        url = f"https://osu.ppy.sh/api/get_user"
+        key = username.lower()
+        stats = user_stats_cache.get(key)
+        if stats is None:
+            stats = user_stats_requests.do(key, lambda: self._fetch_user_stats(username))
+        return stats
+
+    def get_users_stats(self, usernames: List[str]) -> List[dict]:
+        # Each lookup waits on the rate limiter on its own thread, so N users cost about one round trip
+        return list(user_lookup_pool.map(self.get_user_stats, usernames))
+
+    def _fetch_user_stats(self, username: str) -> dict:
+        url = f"{OSU_BASE_URL}/api/get_user"
         params = {
             'k': self.api_key,
             'u': username,
@@ -54,49 +93,86 @@ class OsuAPIClient:
         if response.status_code == 200:
             data = response.json()
             if data:
+                user_stats_cache.put(username.lower(), data[0])
                 return data[0]
             else:
-                raise ValueError("User not found")
+                raise ValueError(f"User {username} not found")
         else:
             raise ConnectionError(f"Failed to get user stats. Status code: {response.status_code}")
 
-    def download_map(self, map_id: str) -> str:
-        file_path = os.path.join(MAPS_DIRECTORY, f"{map_id}.osu")
-        if not os.path.exists(file_path):
-            url = f"https://osu.ppy.sh/osu/{map_id}"
-            response = self.rate_limited_request(url)
-            if response.status_code == 200:
-                with open(file_path, "wb") as f:
-                    f.write(response.content)
-            else:
+    def download_map(self, map_id: str) -> bytes:
+        data = get_beatmap_store().get(map_id)
+        if data is None:
+            data = map_downloads.do(str(map_id), lambda: self._download_map(map_id))
+        return data
+
+    def _download_map(self, map_id: str) -> bytes:
+        store = get_beatmap_store()
+        data = store.get(map_id)
+        if data is not None:
+            return data
+
+        # Maps saved by older versions as loose {map_id}.osu files are moved into the store on first use
+        legacy_path = os.path.join(MAPS_DIRECTORY, f"{map_id}.osu")
+        if os.path.exists(legacy_path):
+            with open(legacy_path, "rb") as f:
+                store.put_stream(map_id, iter(lambda: f.read(65536), b""))
+            os.remove(legacy_path)
+            return store.get(map_id)
+
+        url = f"{OSU_BASE_URL}/osu/{map_id}"
+        response = self.rate_limited_request(url, stream=True)
+        with response:
+            if response.status_code != 200:
                 raise ConnectionError("Failed to download .osu file")
-        return file_path
+            try:
+                store.put_stream(map_id, response.iter_content(chunk_size=65536))
+            except requests.RequestException as e:
+                raise ConnectionError(f"Failed to download .osu file: {e}") from e
+            except ValueError:
+                raise ValueError("Map not found")
+
+        data = store.get(map_id)
+        if data is None:
+            raise ConnectionError("Failed to read back the downloaded .osu file")
+        return data
     
     def get_last_play(self, username: str) -> dict:
-        url = "https://osu.ppy.sh/api/get_user_recent"
+        return self.get_recent_plays(username, 1)[0]
+
+    def get_recent_plays(self, username: str, limit: int = 1) -> List[Dict[str, Any]]:
+        url = f"{OSU_BASE_URL}/api/get_user_recent"
         params = {
             'k': self.api_key,
             'u': username,
             'm': 0,
-            'limit': 1,
+            'limit': limit,
             'type': 'string'
         }
         response = self.rate_limited_request(url, params=params)
         if response.status_code == 200:
             data = response.json()
             if data:
-                return data[0]
+                return data
             else:
                 raise ValueError("No recent plays found")
         else:
             raise ConnectionError(f"Failed to get recent play. Status code: {response.status_code}")
 
     def get_user_top_scores(self, username: str, limit: int = 10) -> List[Dict[str, Any]]:
-        url = f"https://osu.ppy.sh/api/get_user_best?k={OSU_API_KEY}&u={username}&m=0&limit={limit}"
+        key = (username.lower(), limit)
+        top_scores = top_scores_cache.get(key)
+        if top_scores is None:
+            top_scores = top_scores_requests.do(key, lambda: self._fetch_user_top_scores(username, limit))
+        return top_scores
+
+    def _fetch_user_top_scores(self, username: str, limit: int) -> List[Dict[str, Any]]:
+        url = f"{OSU_BASE_URL}/api/get_user_best?k={OSU_API_KEY}&u={username}&m=0&limit={limit}"
         response = self.rate_limited_request(url)
         if response.status_code == 200:
             data = response.json()
             if data:
+                top_scores_cache.put((username.lower(), limit), data)
                 return data
             else:
                 raise ValueError("Player not found or no scores available.")
@@ -108,12 +184,4 @@ class OsuAPIClient:
             return 0
         
         total_pp = sum(float(score['pp']) for score in top_scores)
-        return total_pp / len(top_scores)
-
-    def load_map_recommendations(self) -> List[Dict[str, Any]]:
-        recommendations = []
-        for filename in os.listdir(RECOMMENDATIONS_DIRECTORY):
-            if filename.endswith(".json"):
-                with open(os.path.join(RECOMMENDATIONS_DIRECTORY, filename), "r") as f:
-                    recommendations.extend(json.load(f))
-        return recommendations
\ No newline at end of file
+        return total_pp / len(top_scores)
\ No newline at end of file
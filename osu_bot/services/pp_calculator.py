@@ -1,30 +1,84 @@
-from typing import Dict, Tuple
-from rosu_pp_py import Beatmap, Performance
+from typing import Dict, Iterable, Optional, Tuple
+from rosu_pp_py import Beatmap, Difficulty, DifficultyAttributes, Performance
+import config
+from services.osu_api_client import OsuAPIClient
+from utils.lru_cache import LRUCache
+from utils.metrics import calculation_latency, metrics
+from utils.mods import difficulty_key
+from utils.single_flight import SingleFlight
 from utils.utils import calculate_bpm, mods_to_string
 
+BEATMAP_CACHE_MAX_ENTRIES = getattr(config, "BEATMAP_CACHE_MAX_ENTRIES", 512)
+BEATMAP_CACHE_MAX_BYTES = getattr(config, "BEATMAP_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+DIFFICULTY_CACHE_MAX_ENTRIES = getattr(config, "DIFFICULTY_CACHE_MAX_ENTRIES", 4096)
+DEFAULT_ACCURACIES = (95, 98, 99, 100)
+
+# Parsed beatmaps shared by every PPCalculator, keyed by beatmap id and sized by their .osu file
+beatmap_cache = LRUCache(BEATMAP_CACHE_MAX_ENTRIES, BEATMAP_CACHE_MAX_BYTES)
+# {(beatmap_id, difficulty_key(mods)): (DifficultyAttributes, cs, hp)} - accuracy, combo and HD/NF/SD/PF/SO never affect these
+difficulty_cache = LRUCache(DIFFICULTY_CACHE_MAX_ENTRIES)
+# Concurrent requests for the same map or (map, mods) share one parse / difficulty pass
+beatmap_loads = SingleFlight()
+difficulty_calculations = SingleFlight()
+metrics.register_stats("beatmap_cache", beatmap_cache.stats)
+metrics.register_stats("difficulty_cache", difficulty_cache.stats)
+
+
 class PPCalculator:
-    def calculate_pp(self, beatmap_path: str, mods: int) -> Tuple[Dict[str, int], float, float, float, float, float]:
-        beatmap = Beatmap(path=beatmap_path)
+    def __init__(self, api_client: OsuAPIClient = None):
+        self.api_client = api_client or OsuAPIClient()
+
+    def get_beatmap(self, beatmap_id) -> Beatmap:
+        beatmap_id = int(beatmap_id)
+        beatmap = beatmap_cache.get(beatmap_id)
+        if beatmap is None:
+            beatmap = beatmap_loads.do(beatmap_id, lambda: self._load_beatmap(beatmap_id))
+        return beatmap
+
+    def _load_beatmap(self, beatmap_id: int) -> Beatmap:
+        data = self.api_client.download_map(str(beatmap_id))
+        with calculation_latency.time(operation="parse"):
+            beatmap = Beatmap(bytes=data)
+        beatmap_cache.put(beatmap_id, beatmap, len(data))
+        return beatmap
+
+    def get_difficulty(self, beatmap_id, mods: int) -> Tuple[DifficultyAttributes, float, float]:
+        key = (int(beatmap_id), difficulty_key(mods))
+        entry = difficulty_cache.get(key)
+        if entry is None:
+            entry = difficulty_calculations.do(key, lambda: self._calculate_difficulty(key))
+        return entry
+
+    def _calculate_difficulty(self, key: Tuple[int, int]) -> Tuple[DifficultyAttributes, float, float]:
+        beatmap_id, mods = key
+        beatmap = self.get_beatmap(beatmap_id)
+        with calculation_latency.time(operation="difficulty"):
+            entry = (Difficulty(mods=mods).calculate(beatmap), beatmap.cs, beatmap.hp)
+        difficulty_cache.put(key, entry)
+        return entry
+
+    def calculate_pp_values(self, beatmap_id, mods: int, accuracies: Iterable[float] = DEFAULT_ACCURACIES, combo: Optional[int] = None) -> Dict[str, float]:
+        difficulty_attrs, _, _ = self.get_difficulty(beatmap_id, mods)
+        perf = Performance(mods=mods)
+        if combo is not None:
+            perf.set_combo(combo)
+
         pp_values = {}
-        
-        for acc in [95, 98, 99, 100]:
-            perf = Performance(accuracy=acc, mods=mods)
-            attrs = perf.calculate(beatmap)
-            pp_values[str(acc)] = round(attrs.pp)
-        
-        difficulty_attrs = Performance(mods=mods).calculate(beatmap)
-        stars = difficulty_attrs.difficulty.stars
-        ar = difficulty_attrs.difficulty.ar
-        od = difficulty_attrs.difficulty.od
-        cs = beatmap.cs
-        hp = beatmap.hp
-
-        return pp_values, stars, ar, od, cs, hp
+        with calculation_latency.time(operation="performance"):
+            for acc in accuracies:
+                perf.set_accuracy(acc)
+                pp_values[str(acc)] = perf.calculate(difficulty_attrs).pp
+        return pp_values
+
+    def calculate_pp(self, beatmap_id, mods: int, accuracies: Iterable[float] = DEFAULT_ACCURACIES) -> Tuple[Dict[str, int], float, float, float, float, float]:
+        difficulty_attrs, cs, hp = self.get_difficulty(beatmap_id, mods)
+        pp_values = {acc: round(pp) for acc, pp in self.calculate_pp_values(beatmap_id, mods, accuracies).items()}
+        return pp_values, difficulty_attrs.stars, difficulty_attrs.ar, difficulty_attrs.od, cs, hp
 
     def format_pp_result(self, map_info: Dict, pp_values: Dict[str, int], stars: float, ar: float, od: float, cs: float, hp: float, mods: int) -> str:
         mods_string = mods_to_string(mods)
         beatmap_url = f"https://osu.ppy.sh/beatmapsets/{map_info['beatmapset_id']}#osu/{map_info['beatmap_id']}"
-        
+
         return (
             f"[{beatmap_url} {map_info['artist']} - {map_info['title']} [{map_info['version']}]] "
             f"{mods_string}| "
@@ -33,9 +87,9 @@ class PPCalculator:
             f"| AR:{ar:.1f} OD:{od:.1f} CS:{cs:.1f} HP:{hp:.1f} "
             f"| PP: 95%: {pp_values['95']}pp, 98%: {pp_values['98']}pp, 99%: {pp_values['99']}pp, 100%: {pp_values['100']}pp"
         )
-        
-    def calculate_fc_pp(self, beatmap_path: str, mods: int, accuracy: float, combo: int) -> float:
-        beatmap = Beatmap(path=beatmap_path)
+
+    def calculate_fc_pp(self, beatmap_id, mods: int, accuracy: float, combo: int) -> float:
+        difficulty_attrs, _, _ = self.get_difficulty(beatmap_id, mods)
         perf = Performance(accuracy=accuracy, mods=mods, combo=combo)
-        attrs = perf.calculate(beatmap)
-        return attrs.pp
\ No newline at end of file
+        with calculation_latency.time(operation="performance"):
+            return perf.calculate(difficulty_attrs).pp
\ No newline at end of file
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple
+
+import config
+from services.pp_calculator import PPCalculator
+from utils.mods import difficulty_key, mods_to_int
+
+PRECOMPUTE_MOD_COMBOS = getattr(config, "PRECOMPUTE_MOD_COMBOS", ["HD", "HR", "DT", "HDHR", "HDDT", "EZ", "HT"])
+# Fraction of one core the background thread may keep busy
+PRECOMPUTE_CPU_SHARE = getattr(config, "PRECOMPUTE_CPU_SHARE", 0.25)
+
+
+class PrecomputeJob(NamedTuple):
+    sender: str
+    beatmap_id: int
+    mods: int
+    generation: int
+
+
+class PPPrecomputer:
+    def __init__(self, pp_calculator: PPCalculator, mod_combos: List[str] = PRECOMPUTE_MOD_COMBOS, cpu_share: float = PRECOMPUTE_CPU_SHARE):
+        self.pp_calculator = pp_calculator
+        # Combos sharing a difficulty key (HD and NoMod, HDDT and DT, ...) share one cache entry
+        self.mod_combos = list(dict.fromkeys(difficulty_key(mods_to_int(combo)) for combo in mod_combos))
+        self.cpu_share = cpu_share
+        self._condition = threading.Condition()
+        self._jobs = deque()
+        self._generations: Dict[str, int] = {}
+        self.completed = 0
+        self.cancelled = 0
+
+        thread = threading.Thread(target=self._run, name="pp-precompute")
+        thread.daemon = True
+        thread.start()
+
+    def schedule(self, sender: str, beatmap_id, mods: int):
+        with self._condition:
+            # A newer map from the same sender supersedes whatever was queued or running for them
+            generation = self._generations.get(sender, 0) + 1
+            self._generations[sender] = generation
+            self._jobs = deque(job for job in self._jobs if job.sender != sender)
+            self._jobs.append(PrecomputeJob(sender, int(beatmap_id), mods, generation))
+            self._condition.notify()
+
+    def _is_current(self, job: PrecomputeJob) -> bool:
+        return self._generations.get(job.sender) == job.generation
+
+    def _next_job(self) -> PrecomputeJob:
+        with self._condition:
+            while not self._jobs:
+                self._condition.wait()
+            return self._jobs.popleft()
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            for mods in self.mod_combos:
+                if not self._is_current(job):
+                    self.cancelled += 1
+                    break
+                if mods == difficulty_key(job.mods):
+                    continue
+                start = time.perf_counter()
+                try:
+                    self.pp_calculator.get_difficulty(job.beatmap_id, mods)
+                except Exception as e:
+                    logging.debug(f"Precompute of {job.beatmap_id} +{mods} failed: {e}")
+                    break
+                elapsed = time.perf_counter() - start
+                # Idling in proportion to the work done keeps this thread at cpu_share of a core
+                time.sleep(elapsed * (1 - self.cpu_share) / self.cpu_share)
+            else:
+                self.completed += 1
+
+            with self._condition:
+                if self._is_current(job):
+                    del self._generations[job.sender]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queued': len(self._jobs),
+            'completed': self.completed,
+            'cancelled': self.cancelled,
+        }
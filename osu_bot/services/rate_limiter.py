@@ -0,0 +1,82 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict
+
+import config
+from config import REQUEST_INTERVAL
+from utils.metrics import metrics, rate_limiter_wait
+
+API_REQUESTS_PER_SECOND = getattr(config, "API_REQUESTS_PER_SECOND", 1 / REQUEST_INTERVAL)
+API_BURST = getattr(config, "API_BURST", 5)
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class TokenBucketRateLimiter:
+    def __init__(self, rate: float, burst: int, name: str = "api"):
+        self.name = name
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        self._waiters = []  # heap of (priority, sequence) tickets
+        self._sequence = itertools.count()
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.wait_by_priority: Dict[int, float] = {}
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        start = time.monotonic()
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    self._refill(time.monotonic())
+                    if self._waiters[0] == ticket:
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            break
+                        self._condition.wait((1 - self._tokens) / self.rate)
+                    else:
+                        self._condition.wait()
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                # Whoever is now at the head of the queue has to recompute its wait
+                self._condition.notify_all()
+
+            waited = time.monotonic() - start
+            self.acquired += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.wait_by_priority[priority] = self.wait_by_priority.get(priority, 0.0) + waited
+        rate_limiter_wait.observe(waited, limiter=self.name, priority=priority)
+        return waited
+
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'acquired': self.acquired,
+            'queued': self.queue_depth(),
+            'total_wait': self.total_wait,
+            'max_wait': self.max_wait,
+            'average_wait': self.total_wait / self.acquired if self.acquired else 0.0,
+        }
+
+
+# Shared by every OsuAPIClient so the osu! API budget is enforced process-wide
+api_rate_limiter = TokenBucketRateLimiter(API_REQUESTS_PER_SECOND, API_BURST)
+metrics.register_stats("api_rate_limiter", api_rate_limiter.stats)
@@ -0,0 +1,210 @@
+import bisect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import config
+from config import RECOMMENDATIONS_DIRECTORY
+from services.skill_profile import SkillProfile
+from utils.mods import recommendation_key
+
+try:
+    from services.recommendation_pool import RecommendationPool
+except ImportError:
+    # numpy is optional; without it lookups fall back to the bisect buckets and the plain pp band
+    RecommendationPool = None
+
+RECOMMENDATIONS_RELOAD_INTERVAL = getattr(config, "RECOMMENDATIONS_RELOAD_INTERVAL", 30)
+# Written by tools.convert_pool; when present (and numpy is installed) it is memory-mapped instead of loading the JSON files
+RECOMMENDATION_POOL_PATH = getattr(config, "RECOMMENDATION_POOL_PATH", os.path.join(RECOMMENDATIONS_DIRECTORY, "pool.bin"))
+
+
+class _ModBucket:
+    __slots__ = ("pp99", "maps", "tag_masks")
+
+    def __init__(self, entries: List[tuple]):
+        entries.sort(key=lambda entry: entry[0])
+        self.pp99 = [entry[0] for entry in entries]
+        self.maps = [entry[1] for entry in entries]
+        self.tag_masks = [entry[2] for entry in entries]
+
+
+class RecommendationIndex:
+    def __init__(self, directory: str = RECOMMENDATIONS_DIRECTORY, reload_interval: float = RECOMMENDATIONS_RELOAD_INTERVAL,
+                 pool_path: Optional[str] = RECOMMENDATION_POOL_PATH):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.pool_path = pool_path
+        self._pool_mtime = None
+        self._stale_warned_mtime = None
+        self._lock = threading.Lock()
+        self._files: Dict[str, tuple] = {}  # {filename: (mtime_ns, [beatmaps])}
+        self._tag_bits: Dict[str, int] = {}
+        self._buckets: Dict[str, _ModBucket] = {}
+        self._pool = None
+        self._last_check = None
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_check is not None and now - self._last_check < self.reload_interval:
+                return
+            self._last_check = now
+
+            if self._refresh_binary():
+                return
+
+            current = {}
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        current[entry.name] = entry.stat().st_mtime_ns
+
+            changed = False
+            for filename in list(self._files):
+                if filename not in current:
+                    del self._files[filename]
+                    changed = True
+
+            for filename, mtime in current.items():
+                cached = self._files.get(filename)
+                if cached and cached[0] == mtime:
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename), "r") as f:
+                        beatmaps = json.load(f)
+                except (OSError, ValueError) as e:
+                    logging.error(f"Failed to load recommendations from {filename}: {e}")
+                    continue
+                self._files[filename] = (mtime, beatmaps)
+                changed = True
+
+            if changed:
+                self._rebuild()
+
+    def _refresh_binary(self) -> bool:
+        if RecommendationPool is None or not self.pool_path:
+            return False
+        try:
+            mtime = os.stat(self.pool_path).st_mtime_ns
+        except FileNotFoundError:
+            if self._pool_mtime is not None:
+                # The binary pool was removed: go back to the JSON files
+                self._pool_mtime = None
+                self._pool = None
+            return False
+        if mtime == self._pool_mtime:
+            self._warn_if_stale(mtime)
+            return True
+        try:
+            pool = RecommendationPool.load(self.pool_path)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Failed to map recommendation pool {self.pool_path}: {e}")
+            return self._pool_mtime is not None
+        self._pool = pool
+        self._pool_mtime = mtime
+        self._files = {}
+        logging.info(f"Recommendation pool mapped from {self.pool_path}: {len(pool)} maps, {len(pool.mods)} mod tables")
+        self._warn_if_stale(mtime)
+        return True
+
+    def _warn_if_stale(self, pool_mtime: int):
+        # The JSON files are ignored while the binary pool exists, so a build without --binary would go unnoticed
+        if self._stale_warned_mtime == pool_mtime:
+            return
+        try:
+            with os.scandir(self.directory) as entries:
+                stale = [entry.name for entry in entries
+                         if entry.name.endswith(".json") and entry.is_file() and entry.stat().st_mtime_ns > pool_mtime]
+        except OSError:
+            return
+        if stale:
+            # Once per pool file, not on every reload check
+            self._stale_warned_mtime = pool_mtime
+            logging.warning(
+                f"{len(stale)} recommendation files in {self.directory} are newer than {self.pool_path}; "
+                f"run tools.convert_pool to serve them"
+            )
+
+    def _rebuild(self):
+        if RecommendationPool is not None:
+            self._pool = RecommendationPool.from_records(beatmap for _, beatmaps in self._files.values() for beatmap in beatmaps)
+            logging.info(f"Recommendation pool rebuilt: {len(self._files)} files, {len(self._pool)} maps, {len(self._pool.mods)} mod tables")
+            return
+
+        entries_by_mods: Dict[str, List[tuple]] = {}
+        for _, beatmaps in self._files.values():
+            for beatmap in beatmaps:
+                tag_mask = self._assign_tag_mask(beatmap.get('tags', ()))
+                for mods, pp_values in beatmap['PP'].items():
+                    entries_by_mods.setdefault(recommendation_key(mods), []).append((pp_values['99'], beatmap, tag_mask))
+
+        # Swapped in one assignment so concurrent lookups always see a complete index
+        self._buckets = {mods: _ModBucket(entries) for mods, entries in entries_by_mods.items()}
+        logging.info(f"Recommendation index rebuilt: {len(self._files)} files, {len(self._buckets)} mod buckets")
+
+    def _assign_tag_mask(self, tags: Iterable[str]) -> int:
+        mask = 0
+        for tag in tags:
+            bit = self._tag_bits.get(tag)
+            if bit is None:
+                bit = 1 << len(self._tag_bits)
+                self._tag_bits[tag] = bit
+            mask |= bit
+        return mask
+
+    def tag_mask(self, tags: Iterable[str]) -> Optional[int]:
+        mask = 0
+        for tag in tags:
+            bit = self._tag_bits.get(tag)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+    def stats_for(self, beatmap_id, mods: int = 0) -> Optional[Dict[str, float]]:
+        self.refresh()
+        pool = self._pool
+        return pool.stats_for(beatmap_id, mods) if pool is not None else None
+
+    def recommend(self, profile: SkillProfile, mods: str, tags: List[str], excluded_ids: Set[Any]) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        pool = self._pool
+        if pool is not None:
+            return pool.recommend(profile, mods, tags, excluded_ids)
+        return self.find(profile.pp, mods, tags, excluded_ids)
+
+    def find(self, user_pp: float, mods: str, tags: List[str], excluded_ids: Set[Any], pp_range: float = 100) -> Optional[Dict[str, Any]]:
+        self.refresh()
+
+        bucket = self._buckets.get(mods)
+        if bucket is None:
+            return None
+
+        required = self.tag_mask(tags)
+        if required is None:
+            return None
+
+        lo = bisect.bisect_left(bucket.pp99, user_pp - pp_range)
+        hi = bisect.bisect_right(bucket.pp99, user_pp + pp_range)
+        if lo >= hi:
+            return None
+
+        def is_suitable(i: int) -> bool:
+            return bucket.tag_masks[i] & required == required and bucket.maps[i]['id'] not in excluded_ids
+
+        # Rejection sampling keeps the pick uniform without scanning the band in the common case
+        for _ in range(min(hi - lo, 16)):
+            i = random.randrange(lo, hi)
+            if is_suitable(i):
+                return bucket.maps[i]
+
+        suitable = [i for i in range(lo, hi) if is_suitable(i)]
+        return bucket.maps[random.choice(suitable)] if suitable else None
+
+
+recommendation_index = RecommendationIndex()
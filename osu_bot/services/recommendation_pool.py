@@ -0,0 +1,357 @@
+import json
+import os
+import random
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+import config
+from config import MODS
+from services.skill_profile import PROFILE_STATS, SkillProfile
+from utils.mods import mods_to_int, recommendation_key
+
+RECOMMENDATION_TOP_K = getattr(config, "RECOMMENDATION_TOP_K", 20)
+# Candidates further than this many pp scales from the user's level are never considered
+RECOMMENDATION_PP_WINDOW = getattr(config, "RECOMMENDATION_PP_WINDOW", 3)
+RECOMMENDATION_MAX_CANDIDATES = getattr(config, "RECOMMENDATION_MAX_CANDIDATES", 50000)
+POOL_ACCURACIES = ("95", "98", "99", "100")
+STAT_COLUMNS = ("AR", "OD", "CS", "HP", "BPM")
+STRING_FIELDS = ("artist", "title", "version")
+DT_MASK = MODS['DT']['mask'] | MODS['NC']['mask']
+# How far a map may drift from the player's usual AR/OD/CS/BPM before it costs as much as one pp scale
+STAT_SCALES = {'AR': 0.6, 'OD': 0.8, 'CS': 0.6, 'BPM': 20.0}
+STAT_WEIGHT = 0.35
+
+# Binary pool layout, little-endian:
+#   8 bytes   POOL_MAGIC
+#   4 bytes   header length, then the JSON header: count, mods, accuracies, tag names and
+#             {array name: [dtype, shape, offset]} with offsets relative to the data section
+#   data      starts at the next ALIGNMENT boundary; every array is aligned the same way:
+#             ids, pp, stars, tags, stat:<column>, the string table (string_offsets, string_blob) and
+#             strings:<field> indices, then per mod key order, positions, pp99, tags and stat:<column>:<mod>
+POOL_MAGIC = b"OSUPOOL\x01"
+POOL_VERSION = 1
+ALIGNMENT = 64
+
+
+def pp_scale(user_pp: float) -> float:
+    return max(25.0, user_pp * 0.1)
+
+
+def ar_to_ms(ar: np.ndarray) -> np.ndarray:
+    return np.where(ar <= 5, 1800 - 120 * ar, 1200 - 150 * (ar - 5))
+
+
+def ms_to_ar(ms: np.ndarray) -> np.ndarray:
+    return np.where(ms >= 1200, (1800 - ms) / 120, 5 + (1200 - ms) / 150)
+
+
+def apply_mods_to_columns(stats: Dict[str, np.ndarray], mods: int) -> Dict[str, np.ndarray]:
+    # Same adjustments as BeatmapRecommender._format_recommended_beatmap, over whole columns
+    ar, od, cs, hp, bpm = (stats[column] for column in STAT_COLUMNS)
+    if mods & DT_MASK:
+        ar = ms_to_ar(ar_to_ms(ar) * 2 / 3)
+        od = (80 - (80 - 6 * od) * 2 / 3) / 6
+        bpm = bpm * 1.5
+    elif mods & MODS['HT']['mask']:
+        ar = ms_to_ar(ar_to_ms(ar) * 4 / 3)
+        od = (80 - (80 - 6 * od) * 4 / 3) / 6
+        bpm = bpm * 0.75
+    if mods & MODS['HR']['mask']:
+        ar, od, cs, hp = np.minimum(ar * 1.4, 10), np.minimum(od * 1.4, 10), np.minimum(cs * 1.3, 10), np.minimum(hp * 1.4, 10)
+    elif mods & MODS['EZ']['mask']:
+        ar, od, cs, hp = ar * 0.5, od * 0.5, cs * 0.5, hp * 0.5
+    return {column: values.astype(np.float32) for column, values in zip(STAT_COLUMNS, (ar, od, cs, hp, bpm))}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class StringColumn:
+    # Per-map indices into one table of unique strings, decoded only when a record is built
+    __slots__ = ("indices", "offsets", "blob")
+
+    def __init__(self, indices: np.ndarray, offsets: np.ndarray, blob: np.ndarray):
+        self.indices = indices
+        self.offsets = offsets
+        self.blob = blob
+
+    def __getitem__(self, row: int) -> str:
+        i = int(self.indices[row])
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])].tobytes().decode("utf-8")
+
+
+class ModColumns:
+    # One mod's scoring columns, rows ordered by 99% pp so a pp window is one contiguous slice of each
+    __slots__ = ("order", "positions", "pp99", "tags", "stats", "incomplete")
+
+    def __init__(self, order: np.ndarray, positions: np.ndarray, pp99: np.ndarray, tags: np.ndarray,
+                 stats: Dict[str, np.ndarray], incomplete: Iterable[str]):
+        self.order = order          # int32, pool rows with a table for the mod by ascending pp99
+        self.positions = positions  # int32[n], inverse of order; -1 for maps without a table
+        self.pp99 = pp99            # float32, in order
+        self.tags = tags            # uint32, in order
+        self.stats = stats          # {"AR": float16, ...} mod-adjusted, in order; half precision is plenty for scoring
+        # Columns with maps missing the value; only these pay for NaN handling when scoring
+        self.incomplete = set(incomplete)
+
+    @classmethod
+    def build(cls, pool: "RecommendationPool", mod: str, mod_index: int) -> "ModColumns":
+        pp99 = pool.pp[:, mod_index, POOL_ACCURACIES.index("99")]
+        order = np.argsort(pp99, kind="stable")
+        # Maps without a table for this mod sort last as NaN and are cut off here
+        order = order[:int(np.count_nonzero(~np.isnan(pp99)))].astype(np.int32)
+        positions = np.full(len(pp99), -1, dtype=np.int32)
+        positions[order] = np.arange(len(order), dtype=np.int32)
+        adjusted = apply_mods_to_columns(pool.stats, mods_to_int(mod))
+        stats = {column: adjusted[column][order].astype(np.float16) for column in PROFILE_STATS}
+        incomplete = [column for column, values in stats.items() if np.isnan(values).any()]
+        return cls(order, positions, pp99[order], pool.tags[order], stats, incomplete)
+
+
+class RecommendationPool:
+    def __init__(self, ids: np.ndarray, pp: np.ndarray, stats: Dict[str, np.ndarray], stars: np.ndarray, tags: np.ndarray,
+                 mods: List[str], tag_names: List[str], strings: Dict[str, Sequence[str]],
+                 mod_columns: Optional[Dict[str, ModColumns]] = None):
+        self.ids = ids                  # int64[n], ascending
+        self.pp = pp                    # float32[n, mods, accuracies], NaN where a map has no table for a mod
+        self.stats = stats              # {"AR": float32[n], ...} without mods
+        self.stars = stars              # float32[n]
+        self.tags = tags                # uint32[n] bitmask over tag_names
+        self.mods = mods
+        self.mod_indices = {mod: i for i, mod in enumerate(mods)}
+        self.tag_names = tag_names
+        self.tag_bits = {tag: 1 << i for i, tag in enumerate(tag_names)}
+        self.strings = strings          # {"artist": list or StringColumn, ...}
+        self._mod_columns: Dict[str, ModColumns] = dict(mod_columns or {})
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "RecommendationPool":
+        by_id = {}
+        for record in records:
+            by_id[int(record['id'])] = record
+        ordered = [by_id[beatmap_id] for beatmap_id in sorted(by_id)]
+
+        mods: Dict[str, int] = {}
+        tag_names: Dict[str, int] = {}
+        for record in ordered:
+            for mod in record['PP']:
+                mods.setdefault(recommendation_key(mod), len(mods))
+            for tag in record.get('tags', ()):
+                tag_names.setdefault(tag, len(tag_names))
+        if len(tag_names) > 32:
+            raise ValueError(f"Too many distinct tags for the pool's 32-bit tag mask: {len(tag_names)}")
+
+        n = len(ordered)
+        pp = np.full((n, len(mods), len(POOL_ACCURACIES)), np.nan, dtype=np.float32)
+        stats = {column: np.full(n, np.nan, dtype=np.float32) for column in STAT_COLUMNS}
+        stars = np.full(n, np.nan, dtype=np.float32)
+        tags = np.zeros(n, dtype=np.uint32)
+        strings = {field: [] for field in STRING_FIELDS}
+        for row, record in enumerate(ordered):
+            for mod, pp_values in record['PP'].items():
+                mod_index = mods[recommendation_key(mod)]
+                for acc_index, acc in enumerate(POOL_ACCURACIES):
+                    if acc in pp_values:
+                        pp[row, mod_index, acc_index] = pp_values[acc]
+            for column in STAT_COLUMNS:
+                if column in record:
+                    stats[column][row] = record[column]
+            if 'difficulty' in record:
+                stars[row] = record['difficulty']
+            tags[row] = sum(1 << tag_names[tag] for tag in record.get('tags', ()))
+            for field, values in strings.items():
+                values.append(record.get(field, ""))
+
+        return cls(np.array(sorted(by_id), dtype=np.int64), pp, stats, stars, tags, list(mods), list(tag_names), strings)
+
+    @classmethod
+    def load(cls, path: str) -> "RecommendationPool":
+        # Every array is a read-only view of the mapped file, so processes sharing a pool share its pages
+        with open(path, "rb") as f:
+            if f.read(len(POOL_MAGIC)) != POOL_MAGIC:
+                raise ValueError(f"{path} is not a recommendation pool file")
+            header_length, = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        if header['version'] != POOL_VERSION or tuple(header['accuracies']) != POOL_ACCURACIES:
+            raise ValueError(f"{path} has an unsupported pool layout (version {header['version']})")
+
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        base = _aligned(len(POOL_MAGIC) + 4 + header_length)
+
+        def array(name: str) -> np.ndarray:
+            dtype, shape, offset = header['arrays'][name]
+            count = int(np.prod(shape))
+            return np.frombuffer(data, dtype=dtype, count=count, offset=base + offset).reshape(shape)
+
+        offsets, blob = array("string_offsets"), array("string_blob")
+        return cls(
+            ids=array("ids"),
+            pp=array("pp"),
+            stats={column: array(f"stat:{column}") for column in STAT_COLUMNS},
+            stars=array("stars"),
+            tags=array("tags"),
+            mods=header['mods'],
+            tag_names=header['tag_names'],
+            strings={field: StringColumn(array(f"strings:{field}"), offsets, blob) for field in STRING_FIELDS},
+            mod_columns={
+                mod: ModColumns(
+                    array(f"order:{mod}"), array(f"positions:{mod}"), array(f"pp99:{mod}"), array(f"tags:{mod}"),
+                    {column: array(f"stat:{column}:{mod}") for column in PROFILE_STATS}, header['incomplete'][mod],
+                )
+                for mod in header['mods']
+            },
+        )
+
+    def save(self, path: str):
+        # Unique strings go into one utf-8 blob; each field keeps a uint32 index per map
+        table: Dict[str, int] = {}
+        string_indices = {}
+        for field in STRING_FIELDS:
+            values = self.strings[field]
+            string_indices[field] = np.fromiter((table.setdefault(values[row], len(table)) for row in range(len(self))), dtype=np.uint32, count=len(self))
+        encoded = [string.encode("utf-8") for string in table]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        arrays = {'ids': self.ids, 'pp': self.pp, 'stars': self.stars, 'tags': self.tags, 'string_offsets': offsets, 'string_blob': blob}
+        arrays.update((f"stat:{column}", values) for column, values in self.stats.items())
+        arrays.update((f"strings:{field}", indices) for field, indices in string_indices.items())
+        incomplete = {}
+        for mod in self.mods:
+            columns = self.mod_columns(mod)
+            arrays.update({f"order:{mod}": columns.order, f"positions:{mod}": columns.positions, f"pp99:{mod}": columns.pp99, f"tags:{mod}": columns.tags})
+            arrays.update((f"stat:{column}:{mod}", values) for column, values in columns.stats.items())
+            incomplete[mod] = sorted(columns.incomplete)
+
+        layout = {}
+        offset = 0
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+            arrays[name] = values
+            layout[name] = [values.dtype.str, list(values.shape), offset]
+            offset = _aligned(offset + values.nbytes)
+        header = json.dumps({
+            'version': POOL_VERSION,
+            'count': len(self),
+            'mods': self.mods,
+            'accuracies': list(POOL_ACCURACIES),
+            'tag_names': self.tag_names,
+            'incomplete': incomplete,
+            'arrays': layout,
+        }).encode("utf-8")
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(POOL_MAGIC + struct.pack("<I", len(header)) + header)
+            base = _aligned(f.tell())
+            for name, values in arrays.items():
+                f.write(b"\0" * (base + layout[name][2] - f.tell()))
+                f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        # Replaced rather than rewritten, so processes still mapping the old file keep a consistent view
+        os.replace(temp_path, path)
+
+    def mod_columns(self, mod: str) -> Optional[ModColumns]:
+        columns = self._mod_columns.get(mod)
+        if columns is None:
+            mod_index = self.mod_indices.get(mod)
+            if mod_index is None:
+                return None
+            columns = ModColumns.build(self, mod, mod_index)
+            self._mod_columns[mod] = columns
+        return columns
+
+    def tag_mask(self, tags: Iterable[str]) -> Optional[int]:
+        mask = 0
+        for tag in tags:
+            bit = self.tag_bits.get(tag)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+    def rows_for_ids(self, beatmap_ids: Iterable[Any]) -> np.ndarray:
+        wanted = np.fromiter((int(beatmap_id) for beatmap_id in beatmap_ids), dtype=np.int64)
+        if not len(self.ids):
+            return wanted[:0]
+        positions = np.minimum(np.searchsorted(self.ids, wanted), len(self.ids) - 1)
+        return positions[self.ids[positions] == wanted]
+
+    def stats_for(self, beatmap_id, mods: int = 0) -> Optional[Dict[str, float]]:
+        rows = self.rows_for_ids([beatmap_id])
+        if not len(rows):
+            return None
+        adjusted = apply_mods_to_columns({column: values[rows] for column, values in self.stats.items()}, mods)
+        return {column: float(values[0]) for column, values in adjusted.items()}
+
+    def recommend(self, profile: SkillProfile, mod: str, tags: List[str], excluded_ids: Iterable[Any],
+                  top_k: int = RECOMMENDATION_TOP_K, window: float = RECOMMENDATION_PP_WINDOW,
+                  max_candidates: int = RECOMMENDATION_MAX_CANDIDATES, rng: random.Random = random) -> Optional[Dict[str, Any]]:
+        columns = self.mod_columns(mod)
+        required = self.tag_mask(tags)
+        if columns is None or required is None:
+            return None
+
+        scale = pp_scale(profile.pp)
+        # Bounds as float32 so searchsorted doesn't upcast the whole column on every lookup
+        low, target, high = np.array([profile.pp - window * scale, profile.pp, profile.pp + window * scale], dtype=np.float32)
+        lo, center = (int(i) for i in np.searchsorted(columns.pp99, [low, target]))
+        hi = int(np.searchsorted(columns.pp99, high, side="right"))
+        # In huge pools only the maps nearest in pp are scored, which keeps lookups in the low milliseconds
+        lo = max(lo, center - max_candidates // 2)
+        hi = min(hi, lo + max_candidates)
+        if lo >= hi:
+            return None
+
+        # One vectorized pass over the window: squared distance in pp scales, plus the player's usual map stats
+        cost = columns.pp99[lo:hi] - target
+        cost /= np.float32(scale)
+        np.square(cost, out=cost)
+        for column, value in profile.stats.items():
+            distance = columns.stats[column][lo:hi] - np.float32(value)
+            # STAT_WEIGHT * (distance / scale) ** 2, folded into a single division
+            distance /= np.float32(STAT_SCALES[column] / STAT_WEIGHT ** 0.5)
+            np.square(distance, out=distance)
+            if column in columns.incomplete:
+                distance[np.isnan(distance)] = 0
+            cost += distance
+
+        suitable = np.ones(hi - lo, dtype=bool)
+        if required:
+            suitable &= (columns.tags[lo:hi] & required) == required
+        excluded = columns.positions[self.rows_for_ids(excluded_ids)]
+        excluded = excluded[(excluded >= lo) & (excluded < hi)]
+        suitable[excluded - lo] = False
+        candidates = np.flatnonzero(suitable)
+        if not len(candidates):
+            return None
+
+        # Picking at random among the best few keeps repeated !r calls from always landing on the same map
+        k = min(top_k, len(candidates))
+        best = candidates[np.argpartition(cost[candidates], k - 1)[:k]]
+        return self.record(int(columns.order[lo + int(best[rng.randrange(k)])]))
+
+    def record(self, row: int) -> Dict[str, Any]:
+        # Rebuilt in the JSON record shape, so formatting code doesn't care where the map came from
+        pp_tables = {}
+        for mod, mod_index in self.mod_indices.items():
+            values = self.pp[row, mod_index]
+            if not np.isnan(values).all():
+                pp_tables[mod] = {acc: float(value) for acc, value in zip(POOL_ACCURACIES, values) if not np.isnan(value)}
+        tag_mask = int(self.tags[row])
+        return {
+            'id': int(self.ids[row]),
+            **{field: values[row] for field, values in self.strings.items()},
+            **{column: float(values[row]) for column, values in self.stats.items()},
+            'difficulty': float(self.stars[row]),
+            'PP': pp_tables,
+            'tags': [tag for tag, bit in self.tag_bits.items() if tag_mask & bit],
+        }
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import config
+from utils.metrics import metrics
+
+SESSION_STORE_PATH = getattr(config, "SESSION_STORE_PATH", "data/sessions/sessions.json")
+SESSION_MAX_USERS = getattr(config, "SESSION_MAX_USERS", 10000)
+SESSION_TTL = getattr(config, "SESSION_TTL", 30 * 24 * 3600)
+SESSION_RECOMMENDED_HISTORY = getattr(config, "SESSION_RECOMMENDED_HISTORY", 200)
+SESSION_SAVE_INTERVAL = getattr(config, "SESSION_SAVE_INTERVAL", 60)
+
+
+class UserSession:
+    __slots__ = ("touched_at", "last_map_id", "last_map_mods", "recommended")
+
+    def __init__(self, history: int):
+        self.touched_at = time.time()
+        self.last_map_id: Optional[int] = None
+        self.last_map_mods = 0
+        self.recommended = deque(maxlen=history)
+
+
+class SessionStore:
+    def __init__(self, path: Optional[str] = SESSION_STORE_PATH, max_users: int = SESSION_MAX_USERS, ttl: float = SESSION_TTL,
+                 history: int = SESSION_RECOMMENDED_HISTORY, save_interval: float = SESSION_SAVE_INTERVAL):
+        self.path = path
+        self.max_users = max_users
+        self.ttl = ttl
+        self.history = history
+        self.save_interval = save_interval
+        # Least recently active first, so expiry and eviction both work from the front
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._saver = None
+        self.evictions = 0
+        self.expirations = 0
+        if path:
+            self.load()
+
+    def _get(self, user: str, create: bool = False) -> Optional[UserSession]:
+        now = time.time()
+        self._expire(now)
+        session = self._sessions.get(user)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[user] = UserSession(self.history)
+            while len(self._sessions) > self.max_users:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._sessions.move_to_end(user)
+        session.touched_at = now
+        return session
+
+    def _expire(self, now: float):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.touched_at < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.expirations += 1
+
+    def _changed(self):
+        self._dirty = True
+        if self.path and self._saver is None:
+            self._saver = threading.Thread(target=self._save_periodically, name="session-saver")
+            self._saver.daemon = True
+            self._saver.start()
+
+    def get_last_map(self, user: str) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            session = self._get(user)
+            if session is None or session.last_map_id is None:
+                return None
+            return session.last_map_id, session.last_map_mods
+
+    def set_last_map(self, user: str, beatmap_id, mods: int) -> Optional[int]:
+        with self._lock:
+            session = self._get(user, create=True)
+            previous = session.last_map_id
+            session.last_map_id = int(beatmap_id)
+            session.last_map_mods = mods
+            self._changed()
+            return previous
+
+    def recommended(self, user: str) -> FrozenSet[int]:
+        with self._lock:
+            session = self._get(user)
+            return frozenset(session.recommended) if session is not None else frozenset()
+
+    def add_recommended(self, user: str, beatmap_id):
+        with self._lock:
+            # Capped history: the oldest recommendations become eligible again
+            self._get(user, create=True).recommended.append(beatmap_id)
+            self._changed()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'users': len(self._sessions),
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not load sessions from {self.path}: {e}")
+            return
+        with self._lock:
+            for user, (touched_at, last_map_id, last_map_mods, recommended) in sorted(data.items(), key=lambda item: item[1][0]):
+                session = UserSession(self.history)
+                session.touched_at = touched_at
+                session.last_map_id = last_map_id
+                session.last_map_mods = last_map_mods
+                session.recommended.extend(recommended)
+                self._sessions[user] = session
+            self._expire(time.time())
+            while len(self._sessions) > self.max_users:
+                self._sessions.popitem(last=False)
+        logging.info(f"Loaded {len(self._sessions)} user sessions")
+
+    def save(self):
+        if not self.path:
+            return
+        # The periodic saver and shutdown may both get here; one save at a time shares the temp file,
+        # and a later snapshot can never be replaced by an older one
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {
+                    user: [session.touched_at, session.last_map_id, session.last_map_mods, list(session.recommended)]
+                    for user, session in self._sessions.items()
+                }
+                self._dirty = False
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            try:
+                with open(temp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                logging.error(f"Could not save sessions to {self.path}: {e}")
+
+    def _save_periodically(self):
+        while True:
+            time.sleep(self.save_interval)
+            self.save()
+
+
+session_store = SessionStore()
+metrics.register_stats("sessions", session_store.stats)
\ No newline at end of file
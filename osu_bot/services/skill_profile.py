@@ -0,0 +1,41 @@
+import math
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional
+
+# Same decay osu! uses when summing a profile's top plays, so the best plays dominate
+TOP_PLAY_WEIGHT = 0.95
+PROFILE_STATS = ("AR", "OD", "CS", "BPM")
+
+
+class SkillProfile(NamedTuple):
+    pp: float
+    # Effective (mod-adjusted) AR/OD/CS/BPM of the maps behind the top plays; only those found in the pool
+    stats: Dict[str, float]
+
+
+def build_skill_profile(top_scores: Iterable[Dict[str, Any]], stats_for: Optional[Callable[[Any, int], Optional[Dict[str, float]]]] = None) -> SkillProfile:
+    total_weight = 0.0
+    weighted_pp = 0.0
+    stat_sums = {column: 0.0 for column in PROFILE_STATS}
+    stat_weights = {column: 0.0 for column in PROFILE_STATS}
+
+    # get_user_best returns plays best first
+    for i, score in enumerate(top_scores):
+        weight = TOP_PLAY_WEIGHT ** i
+        weighted_pp += float(score['pp']) * weight
+        total_weight += weight
+
+        stats = stats_for(score['beatmap_id'], int(score.get('enabled_mods') or 0)) if stats_for else None
+        if not stats:
+            continue
+        for column in PROFILE_STATS:
+            value = stats.get(column)
+            if value is not None and not math.isnan(value):
+                stat_sums[column] += value * weight
+                stat_weights[column] += weight
+
+    if not total_weight:
+        return SkillProfile(0.0, {})
+    return SkillProfile(
+        weighted_pp / total_weight,
+        {column: stat_sums[column] / stat_weights[column] for column in PROFILE_STATS if stat_weights[column]},
+    )
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+import config
+
+SUBSCRIPTIONS_COMPACT_MIN_ENTRIES = getattr(config, "SUBSCRIPTIONS_COMPACT_MIN_ENTRIES", 1000)
+
+ADD = "+"
+REMOVE = "-"
+
+
+def _parse_entry(line: bytes) -> Optional[List[str]]:
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    # Valid JSON of the wrong shape (e.g. {} or [1, 2]) is as corrupt as a torn line
+    if not isinstance(entry, list) or len(entry) != 3 or not all(isinstance(value, str) for value in entry):
+        return None
+    return entry
+
+
+class SubscriptionStore:
+    def __init__(self, log_path: str, legacy_json_path: Optional[str] = None):
+        self.log_path = log_path
+        self.subscribers: Dict[str, Set[str]] = {}  # {twitch_username: set(osu_usernames)}
+        self.subscriptions: Dict[str, Set[str]] = {}  # {osu_username: set(twitch_usernames)}
+        self._lock = threading.RLock()
+        self._log = None
+        self._log_entries = 0
+        self._count = 0
+
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.log_path):
+            self._replay()
+        elif legacy_json_path and os.path.exists(legacy_json_path):
+            self._import_legacy(legacy_json_path)
+        self._log = open(self.log_path, "a", encoding="utf-8")
+
+    def _replay(self):
+        valid_length = 0
+        with open(self.log_path, "rb") as f:
+            lines = f.readlines()
+        for number, line in enumerate(lines, 1):
+            entry = _parse_entry(line)
+            if entry is None:
+                if number == len(lines):
+                    # A torn write from a crash can only be the last line; drop it
+                    logging.warning(f"Discarding corrupt tail of {self.log_path} at byte {valid_length}")
+                    break
+                # Anything earlier was written whole, so only this entry is lost; compaction removes it later
+                logging.warning(f"Skipping corrupt line {number} of {self.log_path}")
+            else:
+                self._apply(*entry)
+            self._log_entries += 1
+            valid_length += len(line)
+        if valid_length != os.path.getsize(self.log_path):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(valid_length)
+
+    def _import_legacy(self, legacy_json_path: str):
+        with open(legacy_json_path, "r") as f:
+            for twitch_username, osu_usernames in json.load(f).items():
+                for osu_username in osu_usernames:
+                    self._apply(ADD, twitch_username, osu_username)
+        self._write_snapshot()
+        logging.info(f"Imported {self.count()} Twitch subscriptions from {legacy_json_path}")
+
+    def _apply(self, op: str, twitch_username: str, osu_username: str):
+        if op == ADD:
+            osu_usernames = self.subscribers.setdefault(twitch_username, set())
+            if osu_username not in osu_usernames:
+                osu_usernames.add(osu_username)
+                self._count += 1
+            self.subscriptions.setdefault(osu_username, set()).add(twitch_username)
+        elif op == REMOVE:
+            if osu_username in self.subscribers.get(twitch_username, ()):
+                self._count -= 1
+            for index, key, value in ((self.subscribers, twitch_username, osu_username),
+                                      (self.subscriptions, osu_username, twitch_username)):
+                values = index.get(key)
+                if values is not None:
+                    values.discard(value)
+                    if not values:
+                        del index[key]
+
+    def _append(self, op: str, twitch_username: str, osu_username: str):
+        self._log.write(json.dumps([op, twitch_username, osu_username]) + "\n")
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._log_entries += 1
+        if self._log_entries > max(SUBSCRIPTIONS_COMPACT_MIN_ENTRIES, 2 * self.count()):
+            self.compact()
+
+    def add(self, twitch_username: str, osu_username: str) -> bool:
+        with self._lock:
+            if osu_username in self.subscribers.get(twitch_username, ()):
+                return False
+            self._append(ADD, twitch_username, osu_username)
+            self._apply(ADD, twitch_username, osu_username)
+            return True
+
+    def remove(self, twitch_username: str, osu_username: str) -> bool:
+        with self._lock:
+            if osu_username not in self.subscribers.get(twitch_username, ()):
+                return False
+            self._append(REMOVE, twitch_username, osu_username)
+            self._apply(REMOVE, twitch_username, osu_username)
+            return True
+
+    def compact(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+            self._write_snapshot()
+            self._log = open(self.log_path, "a", encoding="utf-8")
+
+    def _write_snapshot(self):
+        temp_path = f"{self.log_path}.tmp"
+        entries = 0
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for twitch_username, osu_usernames in self.subscribers.items():
+                for osu_username in osu_usernames:
+                    f.write(json.dumps([ADD, twitch_username, osu_username]) + "\n")
+                    entries += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.log_path)
+        self._log_entries = entries
+
+    def streamers(self) -> List[str]:
+        with self._lock:
+            return list(self.subscribers)
+
+    def subscribers_of(self, twitch_username: str) -> List[str]:
+        with self._lock:
+            return list(self.subscribers.get(twitch_username, ()))
+
+    def subscriptions_of(self, osu_username: str) -> List[str]:
+        with self._lock:
+            return list(self.subscriptions.get(osu_username, ()))
+
+    def streamer_count(self) -> int:
+        return len(self.subscribers)
+
+    def count(self) -> int:
+        return self._count
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,295 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import config
+from config import MAPS_DIRECTORY, RECOMMENDATIONS_DIRECTORY
+from utils.mods import difficulty_key, mods_to_int, recommendation_key
+
+RECOMMENDATION_MOD_SETS = getattr(config, "RECOMMENDATION_MOD_SETS", ["NoMod", "HD", "HR", "DT", "HDHR", "HDDT"])
+RECOMMENDATION_ACCURACIES = (95, 98, 99, 100)
+# Maps are grouped into one output file per id range so an update only rewrites the files it touches
+SHARD_SIZE = 10000
+CHECKPOINT_EVERY = 500
+# Maps read and queued per worker; .osu files are only read once their task is about to be submitted
+TASKS_PER_WORKER = 4
+
+
+def parse_metadata(data: bytes) -> Dict[str, str]:
+    metadata = {}
+    in_metadata = False
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            if in_metadata:
+                break
+            in_metadata = line == "[Metadata]"
+        elif in_metadata and ":" in line:
+            key, value = line.split(":", 1)
+            metadata[key] = value.strip()
+    return metadata
+
+
+def guess_tags(difficulty) -> List[str]:
+    # Rough skill tags from the NoMod difficulty attributes; curated pools may carry better ones
+    tags = []
+    if difficulty.aim >= difficulty.speed * 1.15:
+        tags.append("aim")
+    elif difficulty.speed >= difficulty.aim * 1.15:
+        tags.append("speed")
+    if difficulty.slider_factor < 0.97:
+        tags.append("tech")
+    if difficulty.n_circles + difficulty.n_sliders + difficulty.n_spinners >= 1000:
+        tags.append("consistency")
+    return tags
+
+
+def compute_record(task: Tuple[int, bytes]) -> Tuple[int, Optional[Dict[str, Any]]]:
+    # Outside the try: a missing calculator should fail the build, not skip every map
+    import rosu_pp_py  # noqa: F401
+
+    beatmap_id, data = task
+    # One broken map (bad file, calculator error) must not take down the whole pool build
+    try:
+        return beatmap_id, _compute_record(beatmap_id, data)
+    except Exception as e:
+        logging.warning(f"Skipping beatmap {beatmap_id}: {e}")
+        return beatmap_id, None
+
+
+def _compute_record(beatmap_id: int, data: bytes) -> Optional[Dict[str, Any]]:
+    from rosu_pp_py import Beatmap, Difficulty, GameMode, Performance
+
+    beatmap = Beatmap(bytes=data)
+    if beatmap.mode != GameMode.Osu or beatmap.is_convert:
+        return None
+
+    metadata = parse_metadata(data)
+    pp_tables = {}
+    # HD, HDHR and HDDT reuse the NoMod, HR and DT attributes instead of recalculating them
+    difficulties = {}
+    for mod_set in RECOMMENDATION_MOD_SETS:
+        mods = mods_to_int(mod_set)
+        key = difficulty_key(mods)
+        difficulty = difficulties.get(key)
+        if difficulty is None:
+            difficulty = difficulties[key] = Difficulty(mods=key).calculate(beatmap)
+        performance = Performance(mods=mods)
+        pp_values = {}
+        for acc in RECOMMENDATION_ACCURACIES:
+            performance.set_accuracy(acc)
+            pp_values[str(acc)] = round(performance.calculate(difficulty).pp, 2)
+        pp_tables[recommendation_key(mods)] = pp_values
+    nomod_difficulty = difficulties.get(0) or Difficulty().calculate(beatmap)
+
+    return {
+        'id': beatmap_id,
+        'artist': metadata.get("Artist", "Unknown Artist"),
+        'title': metadata.get("Title", "Unknown Title"),
+        'version': metadata.get("Version", "Unknown Difficulty"),
+        'AR': beatmap.ar,
+        'OD': beatmap.od,
+        'CS': beatmap.cs,
+        'HP': beatmap.hp,
+        'BPM': round(beatmap.bpm, 2),
+        'difficulty': round(nomod_difficulty.stars, 2),
+        'PP': pp_tables,
+        'tags': guess_tags(nomod_difficulty),
+    }
+
+
+class MapSource:
+    def __init__(self, store_directory: Optional[str], osu_directory: Optional[str]):
+        self.store = None
+        if store_directory:
+            from services.beatmap_store import BeatmapStore
+            # The bot may be running on the same store, so the builder must never repair or prune it
+            self.store = BeatmapStore(store_directory, read_only=True)
+        self.osu_directory = osu_directory
+
+    def fingerprints(self) -> Iterator[Tuple[int, str]]:
+        if self.store is not None:
+            for beatmap_id in self.store.ids():
+                entry = self.store.get_entry(beatmap_id)
+                if entry is not None:
+                    yield beatmap_id, f"crc:{entry.crc:08x}:{entry.raw_length}"
+        if self.osu_directory:
+            with os.scandir(self.osu_directory) as entries:
+                for entry in entries:
+                    name, extension = os.path.splitext(entry.name)
+                    if extension == ".osu" and name.isdigit():
+                        stat = entry.stat()
+                        yield int(name), f"file:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def read(self, beatmap_id: int) -> Optional[bytes]:
+        if self.store is not None:
+            data = self.store.get(beatmap_id)
+            if data is not None:
+                return data
+        if self.osu_directory:
+            path = os.path.join(self.osu_directory, f"{beatmap_id}.osu")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return f.read()
+        return None
+
+
+class RecommendationWriter:
+    def __init__(self, output_directory: str):
+        self.output_directory = output_directory
+        self.checkpoint_path = os.path.join(output_directory, ".build_checkpoint")
+        self._shards: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        self._dirty = set()
+        os.makedirs(output_directory, exist_ok=True)
+
+    def load_checkpoint(self) -> Dict[str, str]:
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, "r") as f:
+            return json.load(f)
+
+    def _shard_path(self, shard: int) -> str:
+        return os.path.join(self.output_directory, f"pool-{shard:05d}.json")
+
+    def _shard(self, shard: int) -> Dict[int, Dict[str, Any]]:
+        records = self._shards.get(shard)
+        if records is None:
+            records = {}
+            path = self._shard_path(shard)
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    records = {record['id']: record for record in json.load(f)}
+            self._shards[shard] = records
+        return records
+
+    def add(self, record: Dict[str, Any]):
+        shard = record['id'] // SHARD_SIZE
+        self._shard(shard)[record['id']] = record
+        self._dirty.add(shard)
+
+    def remove(self, beatmap_id: int):
+        shard = beatmap_id // SHARD_SIZE
+        if self._shard(shard).pop(beatmap_id, None) is not None:
+            self._dirty.add(shard)
+
+    def flush(self, checkpoint: Dict[str, str]):
+        for shard in sorted(self._dirty):
+            self._write_json(self._shard_path(shard), sorted(self._shards[shard].values(), key=lambda record: record['id']))
+        self._dirty.clear()
+        # Written after the shards, so a crash can only make us redo work, never skip it
+        self._write_json(self.checkpoint_path, checkpoint)
+
+    @staticmethod
+    def _write_json(path: str, data):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+
+def iter_tasks(source: MapSource, pending: List[Tuple[int, str]]) -> Iterator[Tuple[int, bytes]]:
+    for beatmap_id, _ in pending:
+        data = source.read(beatmap_id)
+        if data is not None:
+            yield beatmap_id, data
+
+
+def build(source: MapSource, writer: RecommendationWriter, workers: int, full: bool = False) -> Dict[str, float]:
+    previous = writer.load_checkpoint()
+    checkpoint = {} if full else dict(previous)
+    fingerprints = dict(source.fingerprints())
+    pending = [(beatmap_id, fingerprint) for beatmap_id, fingerprint in fingerprints.items()
+               if checkpoint.get(str(beatmap_id)) != fingerprint]
+
+    # Maps that disappeared from the source since the last build must stop being recommended
+    removed = [key for key in previous if int(key) not in fingerprints]
+    for key in removed:
+        checkpoint.pop(key, None)
+        writer.remove(int(key))
+    logging.info(f"{len(fingerprints)} maps found, {len(pending)} new or changed, {len(removed)} removed")
+
+    start = time.perf_counter()
+    processed = 0
+    written = 0
+    tasks = iter_tasks(source, pending)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # A bounded window of submitted tasks, so only a few .osu files are held in memory at a time
+        running = set()
+        for task in tasks:
+            running.add(pool.submit(compute_record, task))
+            if len(running) >= max(1, workers) * TASKS_PER_WORKER:
+                break
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                beatmap_id, record = future.result()
+                processed += 1
+                checkpoint[str(beatmap_id)] = fingerprints[beatmap_id]
+                if record is not None:
+                    writer.add(record)
+                    written += 1
+                else:
+                    # A map that used to qualify (e.g. now a convert) must not keep its old record
+                    writer.remove(beatmap_id)
+                if processed % CHECKPOINT_EVERY == 0:
+                    writer.flush(checkpoint)
+                    elapsed = time.perf_counter() - start
+                    logging.info(f"{processed}/{len(pending)} maps, {processed / elapsed:.1f} maps/s")
+
+                task = next(tasks, None)
+                if task is not None:
+                    running.add(pool.submit(compute_record, task))
+    writer.flush(checkpoint)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'found': len(fingerprints),
+        'processed': processed,
+        'written': written,
+        'removed': len(removed),
+        'seconds': elapsed,
+        'maps_per_second': processed / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the !r recommendation pool from stored .osu files")
+    parser.add_argument("--store", default=MAPS_DIRECTORY, help="beatmap store directory (empty string to skip)")
+    parser.add_argument("--osu-dir", default=None, help="additional directory of {beatmap_id}.osu files")
+    parser.add_argument("--output", default=RECOMMENDATIONS_DIRECTORY)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--full", action="store_true", help="ignore the checkpoint and recompute every map")
+    parser.add_argument("--binary", action="store_true", help="also rewrite the memory-mapped pool (needs numpy)")
+    parser.add_argument("--binary-output", default=None,
+                        help="where --binary writes the pool (default: RECOMMENDATION_POOL_PATH for the live output directory, "
+                             "otherwise pool.bin inside --output)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    result = build(MapSource(args.store, args.osu_dir), RecommendationWriter(args.output), args.workers, args.full)
+    logging.info(
+        f"Processed {result['processed']} of {result['found']} maps ({result['written']} written, {result['removed']} removed) "
+        f"in {result['seconds']:.1f}s, {result['maps_per_second']:.1f} maps/s"
+    )
+    if args.binary:
+        from services.recommendation_index import RECOMMENDATION_POOL_PATH
+        from tools.convert_pool import convert
+        binary_output = args.binary_output
+        if binary_output is None:
+            # A scratch build must never replace the pool the bot is serving
+            live = os.path.abspath(args.output) == os.path.abspath(RECOMMENDATIONS_DIRECTORY)
+            binary_output = RECOMMENDATION_POOL_PATH if live else os.path.join(args.output, "pool.bin")
+        converted = convert(args.output, binary_output)
+        logging.info(
+            f"Binary pool written to {binary_output}: {converted['maps']} maps, {converted['bytes'] / 1024 / 1024:.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator
+
+from config import RECOMMENDATIONS_DIRECTORY
+from services.recommendation_index import RECOMMENDATION_POOL_PATH
+from services.recommendation_pool import RecommendationPool
+
+
+def iter_records(directory: str) -> Iterator[Dict[str, Any]]:
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            with open(os.path.join(directory, filename), "r") as f:
+                yield from json.load(f)
+
+
+def convert(directory: str, output: str) -> Dict[str, float]:
+    start = time.perf_counter()
+    pool = RecommendationPool.from_records(iter_records(directory))
+    pool.save(output)
+    return {
+        'maps': len(pool),
+        'mods': len(pool.mods),
+        'bytes': os.path.getsize(output),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the JSON recommendation pool into the memory-mapped binary format")
+    parser.add_argument("--input", default=RECOMMENDATIONS_DIRECTORY, help="directory of JSON pool files")
+    parser.add_argument("--output", default=RECOMMENDATION_POOL_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    result = convert(args.input, args.output)
+    logging.info(
+        f"Wrote {result['maps']} maps with {result['mods']} mod tables to {args.output} "
+        f"({result['bytes'] / 1024 / 1024:.1f} MiB) in {result['seconds']:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
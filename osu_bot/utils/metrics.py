@@ -0,0 +1,256 @@
+import bisect
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import config
+
+METRICS_HOST = getattr(config, "METRICS_HOST", "127.0.0.1")
+# None disables the Prometheus endpoint
+METRICS_PORT = getattr(config, "METRICS_PORT", 9108)
+METRICS_PREFIX = "osu_bot"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+INVALID_NAME_CHARACTERS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ("bucket_counts", "count", "total", "max")
+
+    def __init__(self, buckets: int):
+        self.bucket_counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        # Counts are stored per bucket and made cumulative when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+            series.bucket_counts[index] += 1
+            series.count += 1
+            series.total += value
+            series.max = max(series.max, value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def percentile(self, key: Tuple[str, ...], q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation; good enough for a console summary
+        with self._lock:
+            series = self._series.get(key)
+            if series is None or series.count == 0:
+                return 0.0
+            rank = q * series.count
+            seen = 0
+            for bound, count in zip(self.buckets, series.bucket_counts):
+                seen += count
+                if seen >= rank:
+                    return min(bound, series.max)
+            return series.max
+
+    def summaries(self) -> Dict[Tuple[str, ...], Dict[str, float]]:
+        with self._lock:
+            keys = {key: (series.count, series.total, series.max) for key, series in self._series.items()}
+        return {
+            key: {
+                'count': count,
+                'average': total / count if count else 0.0,
+                'p50': self.percentile(key, 0.5),
+                'p95': self.percentile(key, 0.95),
+                'max': maximum,
+            }
+            for key, (count, total, maximum) in keys.items()
+        }
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((key, list(series.bucket_counts), series.count, series.total) for key, series in self._series.items())
+        for key, bucket_counts, count, total in series_items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics: Dict[str, object] = {}
+        self._stats_sources: Dict[str, Callable[[], Dict]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(f"{self.prefix}_{name}", documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(f"{self.prefix}_{name}", documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def register_stats(self, name: str, source: Callable[[], Dict]):
+        # Existing stats() methods are exported as gauges, read at scrape time
+        with self._lock:
+            self._stats_sources[name] = source
+
+    def _collect_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            sources = dict(self._stats_sources)
+        collected = {}
+        for name, source in sources.items():
+            try:
+                stats = source()
+            except Exception as e:
+                logging.debug(f"Could not collect {name} stats: {e}")
+                continue
+            flat = {}
+            for key, value in stats.items():
+                if isinstance(value, dict):
+                    # One level of nesting, e.g. per-host HTTP stats
+                    for inner_key, inner_value in value.items():
+                        flat[f"{key}_{inner_key}"] = inner_value
+                else:
+                    flat[key] = value
+            collected[name] = {key: value for key, value in flat.items() if isinstance(value, (int, float))}
+        return collected
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, stats in sorted(self._collect_stats().items()):
+            for key, value in sorted(stats.items()):
+                metric_name = INVALID_NAME_CHARACTERS.sub("_", f"{self.prefix}_{name}_{key}")
+                lines.append(f"# TYPE {metric_name} gauge")
+                lines.append(f"{metric_name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            short_name = metric.name[len(self.prefix) + 1:]
+            if isinstance(metric, Histogram):
+                for key, summary in sorted(metric.summaries().items()):
+                    label = ",".join(key)
+                    lines.append(
+                        f"{short_name}[{label}]: n={summary['count']} avg={summary['average'] * 1000:.1f}ms "
+                        f"p50<={summary['p50'] * 1000:.1f}ms p95<={summary['p95'] * 1000:.1f}ms max={summary['max'] * 1000:.1f}ms"
+                    )
+            else:
+                for key, value in sorted(metric.values().items()):
+                    lines.append(f"{short_name}[{','.join(key)}]: {_format_value(value)}")
+        for name, stats in sorted(self._collect_stats().items()):
+            lines.append(f"{name}: " + " ".join(f"{key}={value:.3g}" if isinstance(value, float) else f"{key}={value}" for key, value in stats.items()))
+        return "\n".join(lines)
+
+
+metrics = MetricsRegistry()
+
+command_latency = metrics.histogram("command_duration_seconds", "Time to handle a chat command", ["command"])
+command_errors = metrics.counter("command_errors_total", "Commands that ended in an error reply", ["command"])
+http_latency = metrics.histogram("http_request_duration_seconds", "Outbound HTTP request latency", ["endpoint"])
+http_requests = metrics.counter("http_requests_total", "Outbound HTTP requests by endpoint and status", ["endpoint", "status"])
+calculation_latency = metrics.histogram("pp_calculation_seconds", "rosu-pp parse and calculation time", ["operation"])
+rate_limiter_wait = metrics.histogram("rate_limiter_wait_seconds", "Time spent waiting for a rate limiter token", ["limiter", "priority"])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: Optional[int] = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    if port is None:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"Could not start the metrics endpoint on {host}:{port}: {e}")
+        return None
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http")
+    thread.daemon = True
+    thread.start()
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
\ No newline at end of file
@@ -0,0 +1,118 @@
+from typing import Dict, List
+
+from config import MODS
+
+MOD_NAMES = {
+    'EZ': 'Easy', 'NF': 'NoFail', 'HT': 'HalfTime', 'HR': 'HardRock',
+    'SD': 'SuddenDeath', 'DT': 'DoubleTime', 'NC': 'Nightcore',
+    'HD': 'Hidden', 'FL': 'Flashlight', 'SO': 'SpunOut',
+    'AP': 'Autopilot', 'PF': 'Perfect', 'TD': 'TouchDevice'
+}
+# Pairs the game never allows together; combos containing them are left out of the tables
+INCOMPATIBLE_MODS = [("EZ", "HR"), ("DT", "HT"), ("NC", "HT"), ("NF", "SD"), ("NF", "PF"), ("AP", "SO")]
+
+MOD_MASKS: Dict[str, int] = {mod: info['mask'] for mod, info in MODS.items()}
+FULL_NAME_MASKS: Dict[str, int] = {name.lower(): MOD_MASKS[mod] for mod, name in MOD_NAMES.items() if mod in MOD_MASKS}
+
+
+def _mask(mod: str) -> int:
+    return MOD_MASKS.get(mod, 0)
+
+
+# NC and PF may be configured with or without the DT / SD bit they imply, so only their own bits are folded
+NIGHTCORE_BITS = _mask('NC') & ~_mask('DT')
+PERFECT_BITS = _mask('PF') & ~_mask('SD')
+# Bits that never change star rating or difficulty attributes: HD only matters together with FL
+DIFFICULTY_IGNORED = _mask('NF') | _mask('SD') | PERFECT_BITS | _mask('SO')
+# Bits that change neither difficulty nor pp: SD and PF just fail the play early
+PERFORMANCE_IGNORED = _mask('SD') | PERFECT_BITS
+
+
+def _build_string(mods: int) -> str:
+    if mods == 0:
+        return "NoMod"
+    return "".join(mod for mod, mask in MOD_MASKS.items() if mods & mask)
+
+
+def _valid_combos() -> List[int]:
+    conflicts = {mod: set() for mod in MOD_MASKS}
+    for a, b in INCOMPATIBLE_MODS:
+        if a in conflicts and b in conflicts:
+            conflicts[a].add(b)
+            conflicts[b].add(a)
+    # Grown one mod at a time, so incompatible combos are never generated in the first place
+    combos = [(0, frozenset())]
+    for mod, mask in MOD_MASKS.items():
+        combos += [(combo_mask | mask, used | {mod}) for combo_mask, used in combos if not used & conflicts[mod]]
+    return sorted({combo_mask for combo_mask, _ in combos})
+
+
+# Both directions for every valid combo, built once at import
+MASK_TO_STRING: Dict[int, str] = {mask: _build_string(mask) for mask in _valid_combos()}
+STRING_TO_MASK: Dict[str, int] = {string: mask for mask, string in MASK_TO_STRING.items()}
+
+
+def mods_to_string(mods: int) -> str:
+    string = MASK_TO_STRING.get(mods)
+    return string if string is not None else _build_string(mods)
+
+
+def mods_to_int(mods_string: str) -> int:
+    if not isinstance(mods_string, str):
+        return 0
+    mods_int = STRING_TO_MASK.get(mods_string)
+    if mods_int is None:
+        mods_int = 0
+        for i in range(0, len(mods_string), 2):
+            mods_int |= MOD_MASKS.get(mods_string[i:i+2], 0)
+    return mods_int
+
+
+def parse_mods(mod_strings: List[str]) -> int:
+    if not mod_strings or mod_strings == ['NoMod'] or mod_strings == ['NM']:
+        return 0
+
+    mods = 0
+    for mod in mod_strings:
+        mod = mod.strip().lstrip('+-')
+        upper = mod.upper()
+
+        # Full names are checked first, otherwise "Hidden" would be read as the acronyms "HI", "DD", "EN"
+        if mod.lower() in FULL_NAME_MASKS:
+            mods |= FULL_NAME_MASKS[mod.lower()]
+        elif upper in STRING_TO_MASK:
+            mods |= STRING_TO_MASK[upper]
+        else:
+            for i in range(0, len(upper), 2):
+                sub_mod = upper[i:i+2]
+                if sub_mod not in MOD_MASKS:
+                    raise ValueError(f"Unknown mod: {sub_mod}")
+                mods |= MOD_MASKS[sub_mod]
+
+    return mods
+
+
+def _fold_nightcore(mods: int) -> int:
+    if mods & NIGHTCORE_BITS:
+        mods = (mods & ~NIGHTCORE_BITS) | _mask('DT')
+    return mods
+
+
+def difficulty_key(mods: int) -> int:
+    # Canonical mods for difficulty attributes: NC plays like DT, and HD, NF, SD, PF and SO don't affect them
+    mods = _fold_nightcore(mods) & ~DIFFICULTY_IGNORED
+    if not mods & _mask('FL'):
+        mods &= ~_mask('HD')
+    return mods
+
+
+def performance_key(mods: int) -> int:
+    # Canonical mods for pp: like difficulty_key, but HD, NF and SO keep their pp multipliers
+    return _fold_nightcore(mods) & ~PERFORMANCE_IGNORED
+
+
+def recommendation_key(mods) -> str:
+    # Pool tables and lookups both use this, so "DTHD", "HDNC" and "HDDTSD" all land on "HDDT"
+    if isinstance(mods, str):
+        mods = mods_to_int(mods)
+    return mods_to_string(performance_key(mods))
@@ -1,58 +1,6 @@
-from typing import List, Dict
+from typing import Dict
 from config import MODS
-
-def parse_mods(mod_strings: List[str]) -> int:
-    if not mod_strings or mod_strings == ['NoMod'] or mod_strings == ['NM']:
-        return 0
-    
-    mods = 0
-    mod_mapping = {
-        'EZ': 'Easy', 'NF': 'NoFail', 'HT': 'HalfTime', 'HR': 'HardRock',
-        'SD': 'SuddenDeath', 'DT': 'DoubleTime', 'NC': 'Nightcore',
-        'HD': 'Hidden', 'FL': 'Flashlight', 'SO': 'SpunOut',
-        'AP': 'Autopilot', 'PF': 'Perfect'
-    }
-    
-    reverse_mod_mapping = {v.lower(): k for k, v in mod_mapping.items()}
-    
-    for mod in mod_strings:
-        mod = mod.strip().lstrip('+-')
-        mod_lower = mod.lower()
-        
-        if len(mod) > 2:
-            for i in range(0, len(mod), 2):
-                sub_mod = mod[i:i+2].upper()
-                if sub_mod in MODS:
-                    mods |= MODS[sub_mod]['mask']
-                else:
-                    raise ValueError(f"Unknown mod: {sub_mod}")
-        elif mod.upper() in MODS:
-            mods |= MODS[mod.upper()]['mask']
-        elif mod_lower in reverse_mod_mapping:
-            short_mod = reverse_mod_mapping[mod_lower]
-            mods |= MODS[short_mod]['mask']
-        else:
-            raise ValueError(f"Unknown mod: {mod}")
-    
-    return mods
-
-def mods_to_string(mods: int) -> str:
-    if mods == 0:
-        return "NoMod"
-    mod_string = ""
-    for mod, info in MODS.items():
-        if mods & info['mask']:
-            mod_string += mod
-    return mod_string
-
-def mods_to_int(mods_string: str) -> int:
-    mods_int = 0
-    if isinstance(mods_string, str):
-        for i in range(0, len(mods_string), 2):
-            mod = mods_string[i:i+2]
-            if mod in MODS:
-                mods_int |= MODS[mod]['mask']
-    return mods_int
+from utils.mods import mods_to_int, mods_to_string, parse_mods
 
 def calculate_bpm(base_bpm: float, mods: int) -> int:
     if mods & (MODS['DT']['mask'] | MODS['NC']['mask']):